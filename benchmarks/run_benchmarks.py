@@ -0,0 +1,367 @@
+"""Benchmark the steering, smart flies and spirograph simulations headlessly
+
+Each group runs in its own subprocess (so memory peaks and import state don't leak between
+groups) with OpenCV's GUI calls stubbed out. The startup group times the misc-sims command
+line in fresh interpreters. Results are written as JSON, tagged with the git commit, so runs
+can be compared between commits:
+
+    python benchmarks/run_benchmarks.py -o before.json
+    python benchmarks/run_benchmarks.py -o after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# parameter sweeps: (full, quick)
+SWEEPS = {
+    'steer_particles': ([1000, 5000, 20000, 50000], [1000, 5000]),
+    'flies_population': ([100, 500, 2000], [100, 500]),
+    'flies_lifespan': ([200, 500], [200]),
+    'spiro_circles': ([2, 3, 5, 8], [2, 3]),
+}
+
+# command lines timed by the startup group (run as python -m misc_sims ...)
+STARTUP_COMMANDS = {
+    'help': ['--help'],
+    'steer_help': ['steer', '--help'],
+    'spiro_headless': ['spiro', '--headless', '--seed', '0', '-n', '2'],
+    'flies_headless': ['flies', '--headless', '-g', '1', '-f', '10', '-l', '10', '-s', '0'],
+}
+
+
+def _stub_gui(cv2):
+    # run GUI-bound loops without a display: no windows, and no key is ever pressed
+    cv2.imshow = lambda *args, **kwargs: None
+    cv2.waitKey = lambda *args, **kwargs: -1
+    cv2.namedWindow = lambda *args, **kwargs: None
+    cv2.setMouseCallback = lambda *args, **kwargs: None
+    cv2.destroyAllWindows = lambda *args, **kwargs: None
+
+
+def _max_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def measure(case, params, unit, run, work, repeat=1):
+    """Time run() (best of repeat) and return a result row
+
+    Peak traced memory comes from one extra run under tracemalloc, which is kept out of the
+    timings since tracing slows allocation down.
+
+    :param work: units of work per run (frames, generations, points) for the throughput
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'case': case,
+            'params': params,
+            'value': round(work / best, 3),
+            'unit': unit,
+            'seconds': round(best, 6),
+            'peak_traced_mb': round(peak / 1024 ** 2, 3),
+            'max_rss_mb': round(_max_rss_mb(), 1)}
+
+
+def bench_steer(quick, repeat):
+    import numpy as np
+    from py_steering.particle_class import ParticleSystem, random_locations
+    from py_steering.renderers import get_renderer
+    from py_steering.resample import ContourSet
+    from py_steering.scene_class import SteerScene
+    from py_steering.utils import image_to_particles
+    import cv2
+
+    image = cv2.imread(os.path.join(REPO_DIR, 'py_steering', 'input', 'dual_logo.png'))
+    canvas = np.zeros_like(image)
+    h, w = canvas.shape[:2]
+    n_frames = 30 if quick else 100
+    # a cursor circling the canvas so the flee path is exercised
+    angles = np.linspace(0, 2 * np.pi, n_frames)
+    cursor_path = np.stack([w / 2 + w / 3 * np.cos(angles), h / 2 + h / 3 * np.sin(angles)], axis=1)
+
+    for every_n in ([20] if quick else [20, 5]):
+        n_targets = len(image_to_particles(image, canvas, every_n=every_n, cache_dir=None))
+        yield measure('image_to_particles', {'every_n': every_n}, 'targets/s',
+                      lambda: image_to_particles(image, canvas, every_n=every_n, cache_dir=None), n_targets, repeat)
+
+    contours = ContourSet.from_image(image, cache_dir=None)
+    for budget in ([1000] if quick else [1000, 5000]):
+        yield measure('contour_resample', {'budget': budget}, 'targets/s',
+                      lambda: contours.resample(budget), budget, repeat)
+
+    rng = np.random.default_rng(0)
+    for n in SWEEPS['steer_particles'][quick]:
+        targets = rng.integers(0, (w, h), size=(n, 2))
+        colors = rng.integers(0, 256, size=(n, 3))
+
+        for renderer in ('none', 'cv2', 'sprite'):
+            scene = SteerScene(canvas, ParticleSystem(random_locations(n, canvas), targets, 4, colors),
+                               renderer=None if renderer == 'none' else get_renderer(renderer))
+            frame = np.empty_like(canvas)
+
+            def run():
+                for mouse_loc in cursor_path:
+                    scene.step(tuple(mouse_loc))
+                    if renderer != 'none':
+                        np.copyto(frame, canvas)
+                        scene.render(frame)
+
+            case = 'physics' if renderer == 'none' else 'physics+render'
+            yield measure(case, {'particles': n, 'renderer': renderer}, 'frames/s',
+                          run, n_frames, repeat)
+
+
+def bench_flies(quick, repeat):
+    import numpy as np
+    from py_smart_flies.fly_class import Fly, Population
+    from py_smart_flies.smart_fly_class import SmartFlies
+
+    # simulation only (no drawing or mating): the per-fly loop vs the vectorized Population,
+    # flying the same flight paths on the same course
+    n_flies, lifespan = 200, 200 if quick else 500
+    params = {'flies': n_flies, 'lifespan': lifespan, 'obstacles': 4}
+    course = SmartFlies(n_flies=1, n_obstacles=4, lifespan=lifespan, seed=0)
+    population = Population(n_flies, course.course_dims, course.target, course.obstacles, lifespan)
+    flies = [Fly(course.course_dims, course.target, course.obstacles, lifespan) for _ in range(n_flies)]
+    for fly, flight_path in zip(flies, population.flight_path):
+        fly.flight_path = flight_path
+
+    def per_fly_generation():
+        for _ in range(lifespan):
+            for fly in flies:
+                fly.update()
+        for fly in flies:
+            fly.evaluate_fitness()
+            fly.reset()
+
+    def population_generation():
+        for _ in range(lifespan):
+            population.update()
+        population.evaluate_fitness()
+        population.reset()
+
+    yield measure('per_fly_loop', params, 'generations/s', per_fly_generation, 1, repeat)
+    row = measure('population_loop', params, 'generations/s', population_generation, 1, repeat)
+    row['same_successes'] = bool(np.array_equal([fly.succeeded for fly in flies], population.succeeded))
+    yield row
+
+    n_generations = 2 if quick else 5
+    for n_flies in SWEEPS['flies_population'][quick]:
+        for lifespan in SWEEPS['flies_lifespan'][quick]:
+            params = {'flies': n_flies, 'lifespan': lifespan, 'obstacles': 4}
+            smart_flies = SmartFlies(n_flies=n_flies, n_obstacles=4, lifespan=lifespan, seed=0)
+
+            def run():
+                for _ in range(n_generations):
+                    smart_flies._run_generation(display=False, victory_lap=False)
+                    smart_flies._mate()
+
+            yield measure('headless_evolution', params, 'generations/s',
+                          run, n_generations, repeat)
+
+            def drawn():
+                smart_flies._run_generation(display=True, victory_lap=False)
+                smart_flies._mate()
+
+            if n_flies <= 500:
+                yield measure('drawn_generation', params, 'generations/s', drawn, 1, repeat)
+
+            yield measure('mate', params, 'generations/s', smart_flies._mate, 1, repeat)
+
+
+def bench_spiro(quick, repeat):
+    import numpy as np
+    from py_spirograph.trajectory import spiro_times, spirograph_path
+    from py_spirograph.utils import draw_spirograph, gen_border_circle, random_config, render_spirograph
+
+    # path throughput over a fixed number of steps; rendering over one period of the curve
+    steps = np.arange(20000 if quick else 100000)
+    for n_circles in SWEEPS['spiro_circles'][quick]:
+        config = random_config(0, n_circles)
+        radii, speeds, pos = config['radii'], config['speeds'], config['pos']
+        params = {'circles': n_circles}
+        t = spiro_times(speeds)
+        max_dist = int(2 * (sum(r * 2 for r in radii[1:]) + radii[0])) + 1
+        canvas_size = (max_dist, max_dist)
+
+        yield measure('closed_form_path', params, 'points/s',
+                      lambda: spirograph_path(radii, speeds, pos, t=steps), len(steps), repeat)
+
+        def stepped():
+            # the original per-step walk along the circle chain
+            angles = [0 for _ in radii]
+            for _ in steps:
+                parent_x = parent_y = parent_radius = 0
+                for i, radius in enumerate(radii):
+                    if i == 0:
+                        x = y = 0
+                    else:
+                        x, y = gen_border_circle(parent_x, parent_y, parent_radius, radius, angles[i],
+                                                 pos[i - 1] if pos else 'out')
+                        angles[i] += speeds[i - 1]
+                    parent_radius, parent_x, parent_y = radius, x, y
+
+        yield measure('stepped_path', params, 'points/s', stepped, len(steps), repeat)
+        yield measure('render_spirograph', params, 'points/s',
+                      lambda: render_spirograph(radii, speeds, pos, canvas_size), len(t), repeat)
+        if not quick or n_circles == 2:
+            yield measure('draw_spirograph', params, 'frames/s',
+                          lambda: draw_spirograph(radii, speeds, pos, canvas_size), len(t), 1)
+
+
+def bench_startup(quick, repeat):
+    # wall time of a fresh interpreter running the command, plus what a plain `import numpy, cv2`
+    # costs for reference; outputs go to a scratch directory
+    import tempfile
+    with tempfile.TemporaryDirectory() as scratch:
+        commands = dict(STARTUP_COMMANDS, import_numpy_cv2=None)
+        for case, argv in commands.items():
+            if argv is None:
+                cmd = [sys.executable, '-c', 'import numpy, cv2']
+            else:
+                cmd = [sys.executable, '-m', 'misc_sims'] + argv
+
+            def run():
+                subprocess.run(cmd, cwd=scratch, env=_package_env(), stdout=subprocess.DEVNULL, check=True)
+
+            row = measure('startup', {'command': case}, 'runs/s', run, 1, max(repeat, 3))
+            row['startup_ms'] = round(row['seconds'] * 1000, 1)
+            yield row
+
+
+BENCHMARKS = {'startup': bench_startup, 'steer': bench_steer, 'flies': bench_flies, 'spiro': bench_spiro}
+
+
+def _package_env():
+    # the packages import from the repo root whether or not misc-sims is installed
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+
+
+def run_worker(group, quick, repeat):
+    """Run one group in this process"""
+    import cv2
+    _stub_gui(cv2)
+    for row in BENCHMARKS[group](quick, repeat):
+        row['group'] = group
+        print(json.dumps(row), flush=True)
+
+
+def run_group(group, quick, repeat):
+    """Run a group's benchmarks in a fresh subprocess and collect its result rows"""
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', group, '--repeat', str(repeat)]
+    if quick:
+        cmd.append('--quick')
+    proc = subprocess.run(cmd, cwd=REPO_DIR, env=_package_env(), stdout=subprocess.PIPE, text=True)
+    rows = [json.loads(line) for line in proc.stdout.splitlines() if line.startswith('{')]
+    if proc.returncode:
+        rows.append({'group': group, 'error': 'benchmark process exited with {}'.format(proc.returncode)})
+    return rows
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git'] + list(args), cwd=REPO_DIR, stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, text=True).stdout.strip()
+        except OSError:
+            return ''
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def environment_info():
+    import cv2
+    import numpy
+    return {'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+def _row_key(row):
+    return row['group'], row['case'], json.dumps(row['params'], sort_keys=True)
+
+
+def compare(results, baseline, threshold=0.1):
+    """Print throughput changes vs a baseline results dict; returns the number of regressions"""
+    baseline_rows = {_row_key(row): row for row in baseline['results'] if 'error' not in row}
+    regressions = 0
+    print('\n{:<7} {:<20} {:<45} {:>12} {:>12} {:>8}'.format('group', 'case', 'params',
+                                                           'baseline', 'current', 'change'))
+    for row in results['results']:
+        if 'error' in row or _row_key(row) not in baseline_rows:
+            continue
+        old = baseline_rows[_row_key(row)]['value']
+        change = row['value'] / old - 1 if old else float('inf')
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('{:<7} {:<20} {:<45} {:>12.1f} {:>12.1f} {:>+7.1%}{}'.format(
+            row['group'], row['case'], json.dumps(row['params']), old, row['value'], change, flag))
+    print('\ncompared to {} ({} regressions worse than {:.0%})'.format(
+        baseline.get('git', {}).get('commit', '?')[:10], regressions, threshold))
+    return regressions
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-g', '--groups', nargs='+', choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS),
+                    help='benchmark groups to run')
+    ap.add_argument('-q', '--quick', action='store_true', help='smaller sweeps for a fast smoke run')
+    ap.add_argument('-r', '--repeat', type=int, default=3, help='runs per case; the fastest is reported')
+    ap.add_argument('-o', '--output', type=str, default='benchmark_results.json', help='path to write results to')
+    ap.add_argument('-c', '--compare', type=str, help='results JSON from an earlier run to compare against')
+    ap.add_argument('-t', '--threshold', type=float, default=0.1,
+                    help='throughput drop (fraction) reported as a regression by --compare')
+    ap.add_argument('--worker', choices=sorted(BENCHMARKS), help=argparse.SUPPRESS)
+    args = vars(ap.parse_args())
+
+    if args['worker']:
+        run_worker(args['worker'], args['quick'], args['repeat'])
+        sys.exit()
+
+    results = {'git': git_info(),
+               'environment': environment_info(),
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'quick': args['quick'],
+               'results': []}
+    for group in args['groups']:
+        rows = run_group(group, args['quick'], args['repeat'])
+        for row in rows:
+            if 'error' in row:
+                print('{:<7} {}'.format(group, row['error']))
+            else:
+                print('{:<7} {:<20} {:<45} {:>12.1f} {}{}'.format(
+                    group, row['case'], json.dumps(row['params']), row['value'], row['unit'],
+                    ' ({} ms)'.format(row['startup_ms']) if 'startup_ms' in row else ''))
+        results['results'] += rows
+
+    with open(args['output'], 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nwrote {}'.format(args['output']))
+
+    if args['compare']:
+        with open(args['compare']) as f:
+            regressions = compare(results, json.load(f), args['threshold'])
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1 @@
+"""Code shared by the py_steering, py_smart_flies and py_spirograph simulations"""
@@ -0,0 +1,34 @@
+"""The misc-sims command line: one subcommand per simulation
+
+Each subcommand's module only imports argparse at module level, so building the parser (and
+`--help`) stays cheap; OpenCV, NumPy and the simulation code are imported by the chosen
+subcommand's main().
+"""
+import argparse
+import importlib
+
+# subcommand -> (entry module, help)
+COMMANDS = {
+    'steer': ('py_steering.steer_main', 'particles steering towards the contours of an image'),
+    'flies': ('py_smart_flies.smart_flies', 'flies evolving flight paths around obstacles to a target'),
+    'spiro': ('py_spirograph.spirograph', 'a random spirograph drawing'),
+}
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog='misc-sims', description='Miscellaneous simulations for fun')
+    subparsers = ap.add_subparsers(dest='command', metavar='command', required=True)
+    for name, (module_name, help_text) in COMMANDS.items():
+        module = importlib.import_module(module_name)
+        module.add_arguments(subparsers.add_parser(name, help=help_text, description=help_text))
+    return ap
+
+
+def main(argv=None):
+    args = vars(build_parser().parse_args(argv))
+    module = importlib.import_module(COMMANDS[args.pop('command')][0])
+    return module.main(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Streaming frame writers (GIF, video, PNG sequence) shared by the simulations"""
+import os
+import cv2
+
+try:
+    import imageio
+except ImportError:
+    imageio = None
+
+
+class FrameWriter:
+    frame_i = 0
+
+    def write(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PngSequenceWriter(FrameWriter):
+    """Write frames as a numbered PNG sequence
+
+    :param pattern: a str.format pattern for frame paths (e.g. 'frames/frame_{:05d}.png')
+                    or a directory to write 'frame_00000.png', 'frame_00001.png', ... into
+    """
+    def __init__(self, pattern):
+        if '{' not in pattern:
+            pattern = os.path.join(pattern, 'frame_{:05d}.png')
+        os.makedirs(os.path.dirname(pattern) or '.', exist_ok=True)
+        self.pattern = pattern
+        self.frame_i = 0
+
+    def write(self, frame):
+        cv2.imwrite(self.pattern.format(self.frame_i), frame)
+        self.frame_i += 1
+
+
+class VideoFrameWriter(FrameWriter):
+    """Stream frames into a video file with cv2.VideoWriter (codec picked from the extension)"""
+    fourccs = {'.avi': 'MJPG', '.mp4': 'mp4v', '.mov': 'mp4v', '.mkv': 'mp4v'}
+
+    def __init__(self, path, fps, frame_size):
+        fourcc = self.fourccs.get(os.path.splitext(path)[1].lower(), 'mp4v')
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, tuple(frame_size))
+        if not self.writer.isOpened():
+            raise IOError('could not open video writer for {}'.format(path))
+        self.frame_i = 0
+
+    def write(self, frame):
+        self.writer.write(frame)
+        self.frame_i += 1
+
+    def close(self):
+        self.writer.release()
+
+
+class GifFrameWriter(FrameWriter):
+    """Stream frames into an animated GIF (requires imageio)"""
+    def __init__(self, path, fps):
+        if imageio is None:
+            raise ImportError('writing GIFs requires imageio (pip install imageio)')
+        self.writer = imageio.get_writer(path, mode='I', duration=1000 / fps, loop=0)
+        self.rgb = None
+        self.frame_i = 0
+
+    def write(self, frame):
+        # reuse one RGB buffer instead of allocating a converted copy per frame
+        self.rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.writer.append_data(self.rgb)
+        self.frame_i += 1
+
+    def close(self):
+        self.writer.close()
+
+
+def open_frame_writer(path, fps=30, frame_size=None):
+    """Pick a frame writer from the output path
+
+    '.gif' paths stream to a GIF, other file extensions to a video,
+    and format patterns or directories to a numbered PNG sequence.
+
+    :param frame_size: (width, height) of the frames; required for video output
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.gif':
+        return GifFrameWriter(path, fps)
+    elif '{' in path or not ext:
+        return PngSequenceWriter(path)
+
+    return VideoFrameWriter(path, fps, frame_size)
@@ -0,0 +1,200 @@
+"""Lightweight timing spans and counters for the simulation loops
+
+A loop reports into an Instrument with named spans and counters and marks the end of each
+frame (or generation) with tick():
+
+    instrument = Instrument()
+    while running:
+        with instrument.span('physics'):
+            scene.step(mouse_loc)
+        with instrument.span('render'):
+            scene.render(frame)
+        instrument.count('particles', len(scene.particles))
+        instrument.draw_overlay(frame)
+        instrument.tick()
+    instrument.export('profile.json')
+
+The last `window` ticks are kept per name, so the overlay and the exported histograms show
+recent behaviour rather than an average over the whole run. NULL_INSTRUMENT has the same
+interface and does nothing; it is the default wherever an instrument is optional.
+"""
+import json
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+
+class _Span:
+    # reused for every `with instrument.span(name)` of one name, so timing allocates nothing
+    __slots__ = ('totals', 'name', 'start')
+
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.totals[self.name] = self.totals.get(self.name, 0.0) + elapsed
+        return False
+
+
+class Instrument:
+    """Collect per-tick timings of named spans and per-tick counter totals
+
+    Spans of the same name within one tick add up (e.g. a phase run once per particle group);
+    a span must not be nested inside another span of the same name.
+
+    :param window: number of recent ticks kept per span/counter for stats, the overlay and export
+    :param overlay: whether draw_overlay draws anything
+    """
+    enabled = True
+
+    def __init__(self, window=300, overlay=True):
+        self.window = window
+        self.overlay = overlay
+        self.spans = {}
+        self.counters = {}
+        self.tick_times = deque(maxlen=window)
+        self.n_ticks = 0
+        self._span_totals = {}
+        self._counts = {}
+        self._span_objects = {}
+        self._last_tick = time.perf_counter()
+
+    def span(self, name):
+        """Context manager timing the enclosed block as part of this tick's `name` total"""
+        span = self._span_objects.get(name)
+        if span is None:
+            span = self._span_objects[name] = _Span(self._span_totals, name)
+        return span
+
+    def count(self, name, n=1):
+        """Add n to this tick's `name` counter"""
+        self._counts[name] = self._counts.get(name, 0) + n
+
+    def tick(self):
+        """End the current frame/generation: push its span and counter totals into the window"""
+        now = time.perf_counter()
+        self.tick_times.append(now - self._last_tick)
+        self._last_tick = now
+        self.n_ticks += 1
+
+        for totals, history in ((self._span_totals, self.spans), (self._counts, self.counters)):
+            for name, value in totals.items():
+                if name not in history:
+                    history[name] = deque(maxlen=self.window)
+                history[name].append(value)
+            totals.clear()
+
+    def fps(self):
+        """Ticks per second over the window"""
+        total = sum(self.tick_times)
+        return len(self.tick_times) / total if total else 0.0
+
+    def stats(self):
+        """Summary of the window: milliseconds per tick for each span, per-tick totals for counters"""
+        def summary(values, scale):
+            values = np.fromiter(values, dtype='float64') * scale
+            return {'n': len(values),
+                    'mean': float(values.mean()),
+                    'p50': float(np.percentile(values, 50)),
+                    'p95': float(np.percentile(values, 95)),
+                    'max': float(values.max())}
+
+        return {'ticks': self.n_ticks,
+                'fps': self.fps(),
+                'tick_ms': summary(self.tick_times, 1000) if self.tick_times else None,
+                'spans_ms': {name: summary(values, 1000) for name, values in self.spans.items()},
+                'counters': {name: summary(values, 1) for name, values in self.counters.items()}}
+
+    def histograms(self, bins=20):
+        """Histograms of the windowed span timings (ms) and counter totals
+
+        :return: {'spans_ms': {name: {'edges': [...], 'counts': [...]}}, 'counters': {...}}
+        """
+        def histogram(values, scale):
+            counts, edges = np.histogram(np.fromiter(values, dtype='float64') * scale, bins=bins)
+            return {'edges': edges.round(6).tolist(), 'counts': counts.tolist()}
+
+        spans = {name: histogram(values, 1000) for name, values in self.spans.items()}
+        if self.tick_times:
+            spans['tick'] = histogram(self.tick_times, 1000)
+        return {'spans_ms': spans,
+                'counters': {name: histogram(values, 1) for name, values in self.counters.items()}}
+
+    def export(self, path, bins=20):
+        """Write stats() and histograms() for the current window to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump({'window': self.window, 'stats': self.stats(), 'histograms': self.histograms(bins)},
+                      f, indent=2)
+
+    def overlay_lines(self):
+        lines = ['FPS {:.1f}'.format(self.fps())]
+        for name, values in self.spans.items():
+            lines.append('{} {:.2f} ms'.format(name, 1000 * sum(values) / len(values)))
+        for name, values in self.counters.items():
+            lines.append('{} {:.0f}'.format(name, values[-1]))
+        return lines
+
+    def draw_overlay(self, frame, org=(10, 20), color=(255, 255, 255), font_scale=0.45):
+        """Draw FPS, mean ms per span and the latest counter values onto frame (top left by default)"""
+        if not self.overlay:
+            return frame
+        x, y = org
+        for line in self.overlay_lines():
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), 3)
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, 1)
+            y += int(40 * font_scale)
+        return frame
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullInstrument:
+    """The Instrument interface with every call a no-op (instrumentation disabled)"""
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+    def count(self, name, n=1):
+        pass
+
+    def tick(self):
+        pass
+
+    def draw_overlay(self, frame, *args, **kwargs):
+        return frame
+
+    def fps(self):
+        return 0.0
+
+    def stats(self):
+        return {}
+
+    def histograms(self, bins=20):
+        return {'spans_ms': {}, 'counters': {}}
+
+    def export(self, path, bins=20):
+        pass
+
+    def overlay_lines(self):
+        return []
+
+
+NULL_INSTRUMENT = NullInstrument()
@@ -0,0 +1 @@
+"""Smart flies: a genetic algorithm evolving flight paths around obstacles to a target"""
@@ -0,0 +1,129 @@
+"""Checkpoints of a SmartFlies run: a directory of .npy arrays plus a meta.json header
+
+A checkpoint directory holds one ``gen-NNNNNN`` snapshot per saved generation (the newest
+few are kept). Each snapshot is written to a temporary directory and renamed into place,
+so a killed process never leaves a half-written snapshot behind. Arrays are loaded
+memory-mapped (copy-on-write), so resuming a large population doesn't read it all up front.
+"""
+import os
+import json
+import shutil
+import threading
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+SNAPSHOT_PREFIX = 'gen-'
+
+
+def _snapshot_dirs(path):
+    # complete snapshots, oldest first
+    if not os.path.isdir(path):
+        return []
+    names = [name for name in os.listdir(path)
+             if name.startswith(SNAPSHOT_PREFIX) and name[len(SNAPSHOT_PREFIX):].isdigit()]
+    return [os.path.join(path, name) for name in sorted(names)]
+
+
+def save_checkpoint(path, meta, arrays, keep=2):
+    """Write a snapshot of meta (JSON-serializable dict) and arrays (name -> ndarray) under path
+
+    :param keep: number of most recent snapshots to keep
+    :return: path of the new snapshot directory
+    """
+    snapshot = os.path.join(path, '{}{:06d}'.format(SNAPSHOT_PREFIX, meta['generation_i']))
+    tmp = snapshot + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), array)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(dict(meta, version=CHECKPOINT_VERSION, arrays=sorted(arrays)), f)
+
+    shutil.rmtree(snapshot, ignore_errors=True)
+    os.rename(tmp, snapshot)
+    for old in _snapshot_dirs(path)[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return snapshot
+
+
+def load_checkpoint(path):
+    """Load the newest snapshot under path (or path itself if it is a snapshot directory)
+
+    :return: (meta, arrays) with arrays memory-mapped copy-on-write
+    """
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        snapshots = _snapshot_dirs(path)
+        if not snapshots:
+            raise FileNotFoundError('no checkpoint found in {}'.format(path))
+        path = snapshots[-1]
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != CHECKPOINT_VERSION:
+        raise ValueError('unsupported checkpoint version {!r}'.format(meta.get('version')))
+
+    arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='c') for name in meta['arrays']}
+    return meta, arrays
+
+
+class CheckpointWriter:
+    """Write checkpoints from a background thread so saving doesn't stall evolution
+
+    save() hands over a snapshot and returns immediately. If the previous one is still being
+    written, a snapshot that hasn't started yet is replaced by the newer one, so at most one
+    pending snapshot is held in memory. Errors from the writer thread are raised by the
+    next save() or close().
+    """
+    def __init__(self, path, keep=2):
+        self.path = path
+        self.keep = keep
+        self.pending = None
+        self.error = None
+        self.ready = threading.Condition()
+        self.stopping = False
+
+        self.worker = threading.Thread(target=self._write_loop, daemon=True)
+        self.worker.start()
+
+    def _write_loop(self):
+        while True:
+            with self.ready:
+                self.ready.wait_for(lambda: self.pending is not None or self.stopping)
+                if self.pending is None:
+                    return
+                meta, arrays = self.pending
+                self.pending = None
+            try:
+                save_checkpoint(self.path, meta, arrays, self.keep)
+            except Exception as e:
+                with self.ready:
+                    self.error = e
+            with self.ready:
+                self.ready.notify_all()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, meta, arrays):
+        """Queue a snapshot; arrays must not be modified afterwards (pass copies)"""
+        with self.ready:
+            self._raise_error()
+            self.pending = (meta, arrays)
+            self.ready.notify_all()
+
+    def close(self):
+        """Finish writing the pending snapshot and stop the thread"""
+        with self.ready:
+            self.stopping = True
+            self.ready.notify_all()
+        self.worker.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,114 @@
+from functools import cached_property, lru_cache
+import cv2
+import numpy as np
+
+# course_map cell states
+FREE, STOPPED, ARRIVED = 0, 1, 2
+
+
+class CourseMap:
+    """Per-pixel lookup tables for a static course
+
+    ``state`` holds what happens to a fly at each pixel (FREE, STOPPED by an obstacle or the
+    course edge, or ARRIVED at the target), so collision and success checks for any number of
+    obstacles are a single array lookup. The map has a 1 pixel STOPPED border and lookups clip
+    to it, so every offscreen location reads as STOPPED.
+
+    Distance fields to the target are built on first use:
+    ``euclidean`` is the straight-line distance, ``path`` the shortest distance around the
+    obstacles (see :meth:`path`).
+
+    :param course_dims: (width, height) of the course
+    :param target_location: x, y of the target
+    :param obstacles: obstacle rectangles as [(x0, y0), (x1, y1)] (inclusive)
+    :param target_radius: distance from the target at which a fly has arrived
+    """
+    def __init__(self, course_dims, target_location, obstacles=(), target_radius=19):
+        self.course_dims = tuple(course_dims)
+        self.target_location = tuple(target_location)
+        self.obstacles = obstacles
+        self.target_radius = target_radius
+
+        # valid locations are 0 <= x <= width and 0 <= y <= height, plus the border
+        width, height = self.course_dims
+        self.blocked = np.ones((height + 3, width + 3), dtype=bool)
+        self.blocked[1:-1, 1:-1] = False
+        for (x0, y0), (x1, y1) in obstacles:
+            self.blocked[max(y0, -1) + 1:y1 + 2, max(x0, -1) + 1:x1 + 2] = True
+
+        self.state = np.where(self.blocked, STOPPED, FREE).astype('uint8')
+        self.state[~self.blocked & (self.euclidean <= target_radius)] = ARRIVED
+
+    def _indices(self, locations):
+        locations = np.asarray(locations)
+        x = np.clip(locations[..., 0] + 1, 0, self.blocked.shape[1] - 1)
+        y = np.clip(locations[..., 1] + 1, 0, self.blocked.shape[0] - 1)
+        return y, x
+
+    def lookup(self, field, locations):
+        """Values of field (a map-shaped array such as state or path) at (n, 2) integer x, y locations"""
+        return field[self._indices(locations)]
+
+    @cached_property
+    def euclidean(self):
+        yy, xx = np.mgrid[-1:self.blocked.shape[0] - 1, -1:self.blocked.shape[1] - 1]
+        return np.hypot(xx - self.target_location[0], yy - self.target_location[1]).astype('float32')
+
+    @cached_property
+    def path(self):
+        """Shortest distance to the target moving through free pixels
+
+        Grown as a wavefront from the target with cv2.dilate, alternating 4- and 8-neighbour
+        steps so the distance is the octagonal approximation of the Euclidean one (within ~8%).
+        Blocked pixels (obstacles and the border, where flies stop) get the distance to the
+        nearest free pixel plus how far they are from it, and pixels cut off from the target
+        continue from there, so every location has a finite value.
+        """
+        distance = np.full(self.blocked.shape, np.inf, dtype='float32')
+        reached = np.zeros(self.blocked.shape, dtype='uint8')
+        distance[self._indices(np.array(self.target_location))] = 0
+        reached[self._indices(np.array(self.target_location))] = 1
+        free = (~self.blocked).view('uint8')
+        kernels = (cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3)),
+                   cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+
+        # spread through free pixels; blocked pixels are labelled but don't carry the wavefront on
+        front = reached.copy()
+        step = 0
+        while front.any():
+            step += 1
+            grown = cv2.dilate(front, kernels[step % 2])
+            grown &= 1 - reached
+            distance[grown.view(bool)] = step
+            reached |= grown
+            front = grown & free
+
+        # then fill the rest (deeper inside obstacles, the border, cut-off areas) from their nearest labelled neighbour
+        step = 0
+        while not reached.all():
+            step += 1
+            nearest = cv2.erode(distance, kernels[step % 2], borderType=cv2.BORDER_REPLICATE)
+            grown = (1 - reached).view(bool) & np.isfinite(nearest)
+            if not grown.any():
+                break
+            distance[grown] = nearest[grown] + 1
+            reached[grown] = 1
+        return distance
+
+    def max_distance(self, metric):
+        """Largest distance to the target from a reachable (free) pixel"""
+        field = getattr(self, metric)
+        return float(field[~self.blocked].max(initial=1))
+
+
+@lru_cache(maxsize=16)
+def _cached_course_map(course_dims, target_location, obstacles, target_radius):
+    return CourseMap(course_dims, target_location, obstacles, target_radius)
+
+
+def course_map(course_dims, target_location, obstacles=(), target_radius=19):
+    """Shared CourseMap for a course, built once per distinct course and cached"""
+    obstacles = tuple((tuple(int(v) for v in p0), tuple(int(v) for v in p1)) for p0, p1 in obstacles)
+    return _cached_course_map(tuple(int(v) for v in course_dims),
+                              tuple(int(v) for v in target_location),
+                              obstacles, target_radius)
@@ -1,23 +1,217 @@
+import hashlib
 import cv2
 import numpy as np
+from .course_map import ARRIVED, FREE, course_map
 
 
-class Fly:
-    def __init__(self, course_dims, target_location, obstacles=[], lifespan=300, size=3):
+def random_flight_paths(n_flies, lifespan, rng=None):
+    """Random genomes: one (lifespan, 2) int8 block of x, y velocities in [-5, 5] per fly
+
+    :param rng: numpy.random.Generator to draw from (the global NumPy random state if None)
+    """
+    if rng is None:
+        return np.random.randint(-5, 6, size=(n_flies, lifespan, 2), dtype='int8')
+    return rng.integers(-5, 6, size=(n_flies, lifespan, 2), dtype='int8')
+
+
+class Population:
+    """Struct-of-arrays store for a whole population of flies
+
+    Locations, step counters, success flags, fitness and flight paths (genomes) of every fly
+    live in NumPy arrays so a frame of the whole population advances in a handful of array ops.
+    Indexing or iterating the population yields :class:`Fly` views into these arrays.
+
+    Flies that stop (offscreen or in an obstacle) or reach the target never move again, so
+    they are retired from ``active`` and later frames only touch the flies still flying.
+
+    :param n_flies: number of flies
+    :param course_dims: (width, height) of the course
+    :param target_location: x, y of the target
+    :param obstacles: list of obstacle rectangles as [(x0, y0), (x1, y1)]
+    :param lifespan: number of frames per generation (and genes per flight path)
+    :param size: fly radius when drawn
+    :param fitness: distance to the target that fitness is scored on; 'euclidean' (straight line)
+                    or 'path' (shortest route around the obstacles)
+    :param rng: numpy.random.Generator for the initial flight paths
+    :param flight_path: optional (n_flies, lifespan, 2) int8 initial genomes instead of random ones
+    """
+    def __init__(self, n_flies, course_dims, target_location, obstacles=(), lifespan=300, size=3,
+                 fitness='euclidean', rng=None, flight_path=None):
+        if fitness not in ('euclidean', 'path'):
+            raise ValueError('unknown fitness metric {!r}'.format(fitness))
         self.course_dims = course_dims
-        self.lifespan = lifespan
-        self.size = size
-        self.start_location = np.array([self.course_dims[0] / 2, int(self.course_dims[1] * 0.9)], dtype='int')
-        self.location = self.start_location.copy()
-        self.velocity = np.array([0, -1], dtype='int')
-        self.flight_path = self._random_flight_path()
-        self.step = 0
-        self.fitness = 0.5
         self.target_location = target_location
         self.obstacles = obstacles
-        self.color = (150, 150, 150)
-        self.succeeded = 0
-        self.success_speed = lifespan
+        self.lifespan = lifespan
+        self.size = size
+        self.fitness_metric = fitness
+
+        self.start_location = np.array([course_dims[0] / 2, int(course_dims[1] * 0.9)], dtype='int')
+        self.location = np.tile(self.start_location, (n_flies, 1))
+        self.velocity = np.tile(np.array([0, -1], dtype='int'), (n_flies, 1))
+        if flight_path is None:
+            flight_path = random_flight_paths(n_flies, lifespan, rng)
+        self.flight_path = flight_path
+        self.step = np.zeros(n_flies, dtype='int')
+        self.fitness = np.full(n_flies, 0.5)
+        self.color = np.tile(np.array([150, 150, 150], dtype='uint8'), (n_flies, 1))
+        self.succeeded = np.zeros(n_flies, dtype='int')
+        self.success_speed = np.full(n_flies, lifespan, dtype='int')
+        # indices of flies still flying, and the step each fly reached the target this generation (-1 if not)
+        self.active = np.arange(n_flies)
+        self.arrival_step = np.full(n_flies, -1, dtype='int')
+
+        # the course is static, so collisions, arrivals and distances are precomputed lookups
+        self.course_map = course_map(course_dims, target_location, obstacles)
+
+    def __len__(self):
+        return len(self.location)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('fly index out of range')
+        return Fly.view(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Fly.view(self, i)
+
+    def reset(self):
+        self.location[:] = self.start_location
+        self.step[:] = 0
+        self.fitness[:] = 0.5
+        self.active = np.arange(len(self))
+        self.arrival_step[:] = -1
+
+    def _arrive(self, arrived, steps):
+        # success_speed records the step a fly first reached the target
+        first_arrival = self.succeeded[arrived] == 0
+        self.success_speed[arrived[first_arrival]] = steps[first_arrival]
+        self.arrival_step[arrived] = steps
+        self.location[arrived] = self.target_location
+        self.color[arrived] = (17, 102, 1)
+        self.succeeded[arrived] = 1
+
+    def update(self):
+        """Advance every active fly one frame
+
+        :return: indices of the flies retired this frame
+        """
+        active = self.active
+        # FREE flies keep flying, STOPPED ones (offscreen or in an obstacle) stay put for good
+        state = self.course_map.lookup(self.course_map.state, self.location[active])
+
+        arrived = active[state == ARRIVED]
+        if len(arrived):
+            self._arrive(arrived, self.step[arrived])
+
+        moving = active[state == FREE]
+        self.velocity[moving] = self.flight_path[moving, self.step[moving]]
+        self.location[moving] += self.velocity[moving]
+        self.step[active] += 1
+
+        self.active = moving
+        return active[state != FREE]
+
+    def outcomes(self, flies):
+        """Final locations and arrival steps of flies, to replay() for the same genomes later"""
+        return self.location[flies].copy(), self.arrival_step[flies].copy()
+
+    def replay(self, flies, locations, arrival_steps):
+        """Retire flies straight to the outcome of an earlier simulation of their genomes"""
+        self.location[flies] = locations
+        arrived = arrival_steps >= 0
+        if arrived.any():
+            self._arrive(flies[arrived], arrival_steps[arrived])
+        self.active = np.setdiff1d(self.active, flies, assume_unique=True)
+
+    def genome_hashes(self):
+        """blake2b digest of every fly's flight path"""
+        return [hashlib.blake2b(genome.tobytes(), digest_size=16).digest() for genome in self.flight_path]
+
+    def show(self, course, victory_lap=False, flies=None):
+        """Draw the flies with indices flies (all of them if None) onto course"""
+        if flies is None:
+            flies = slice(None)
+        locations = self.location[flies].tolist()
+        if victory_lap:
+            colors = np.random.randint(0, 266, (len(locations), 3)).tolist()
+        else:
+            colors = self.color[flies].tolist()
+
+        size = self.size
+        for (x, y), color in zip(locations, colors):
+            cv2.circle(course, (x - 3, y - 2), size, (0, 0, 0), 1)
+            cv2.circle(course, (x + 3, y - 2), size, (0, 0, 0), 1)
+            cv2.circle(course, (x, y), size, tuple(color), -1)
+
+    def evaluate_fitness(self):
+        if self.fitness_metric == 'path':
+            max_dist = self.course_map.max_distance('path')
+            dist = self.course_map.lookup(self.course_map.path, self.location)
+        else:
+            max_dist = np.hypot(*self.course_dims)
+            xy_diff = self.location - self.target_location
+            dist = np.sqrt(np.einsum('ij,ij->i', xy_diff, xy_diff))
+        worst_case = max_dist * self.lifespan
+        fitness = self.success_speed * dist
+        fitness_change = np.interp(fitness, [0, worst_case], [2, 0.5])
+
+        self.fitness *= fitness_change
+
+    def success_rate(self):
+        return 100 * int(self.succeeded.sum()) // len(self)
+
+
+def _as_color(color):
+    return tuple(int(x) for x in color)
+
+
+def _view_property(name, cast=None):
+    # expose row i of a Population array as a Fly attribute
+    def getter(self):
+        value = getattr(self._population, name)[self._i]
+        return value if cast is None else cast(value)
+
+    def setter(self, value):
+        getattr(self._population, name)[self._i] = value
+
+    return property(getter, setter)
+
+
+def _shared_property(name):
+    # attributes every fly in a Population has in common
+    return property(lambda self: getattr(self._population, name))
+
+
+class Fly:
+    """A single fly; a thin view into one row of a :class:`Population`"""
+    def __init__(self, course_dims, target_location, obstacles=[], lifespan=300, size=3):
+        self._population = Population(1, course_dims, target_location, obstacles, lifespan, size)
+        self._i = 0
+
+    @classmethod
+    def view(cls, population, i):
+        fly = cls.__new__(cls)
+        fly._population = population
+        fly._i = i
+        return fly
+
+    course_dims = _shared_property('course_dims')
+    target_location = _shared_property('target_location')
+    obstacles = _shared_property('obstacles')
+    lifespan = _shared_property('lifespan')
+    size = _shared_property('size')
+    start_location = _shared_property('start_location')
+
+    location = _view_property('location')
+    velocity = _view_property('velocity')
+    flight_path = _view_property('flight_path')
+    step = _view_property('step', int)
+    fitness = _view_property('fitness', float)
+    color = _view_property('color', _as_color)
+    succeeded = _view_property('succeeded', int)
+    success_speed = _view_property('success_speed', int)
 
     def reset(self):
         self.location = self.start_location.copy()
@@ -25,12 +219,7 @@ class Fly:
         self.fitness = 0.5
 
     def _random_flight_path(self):
-        velocities = []
-        for _ in range(self.lifespan):
-            vx = np.random.randint(-5, 6)
-            vy = np.random.randint(-5, 6)
-            velocities.append(np.array([vx, vy], dtype='int'))
-        return velocities
+        return random_flight_paths(1, self.lifespan)[0]
 
     def _is_offscreen(self):
         return (self.location[0] < 0 or self.location[1] < 0 or
@@ -38,23 +227,17 @@ class Fly:
                 self.location[1] > self.course_dims[1])
 
     def _hit_obstacle(self):
-        hit_obstacle = False
-        if self.obstacles:
-            for obstacle in self.obstacles:
-                hit_obstacle = (obstacle[0][0] <= self.location[0] <= obstacle[1][0] and
-                                obstacle[0][1] <= self.location[1] <= obstacle[1][1])
-                if hit_obstacle:
-                    break
-
-        return hit_obstacle
+        # onscreen, the course map's blocked pixels are exactly the obstacles
+        return bool(self._population.course_map.lookup(self._population.course_map.blocked, self.location))
 
     def update(self):
         if not self._is_offscreen() and not self._hit_obstacle():
             if self._e_dist(self.location, self.target_location) <= 19:
+                if not self.succeeded:
+                    self.success_speed = self.step
                 self.location = self.target_location
                 self.color = (17, 102, 1)
                 self.succeeded = 1
-                self.success_speed = self.step
             else:
                 self.velocity = self.flight_path[self.step]
                 self.location += self.velocity
@@ -65,11 +248,12 @@ class Fly:
             color = (int(x) for x in np.random.randint(0, 266, 3))
         else:
             color = self.color
-        wing_l = (self.location[0] - 3, self.location[1] - 2)
-        wind_r = (self.location[0] + 3, self.location[1] - 2)
+        location = tuple(int(x) for x in self.location)
+        wing_l = (location[0] - 3, location[1] - 2)
+        wind_r = (location[0] + 3, location[1] - 2)
         cv2.circle(course, wing_l, self.size, (0, 0, 0), 1)
         cv2.circle(course, wind_r, self.size, (0, 0, 0), 1)
-        cv2.circle(course, tuple(self.location), self.size, tuple(color), -1)
+        cv2.circle(course, location, self.size, tuple(color), -1)
 
     @staticmethod
     def _e_dist(xy1, xy2):
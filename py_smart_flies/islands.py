@@ -0,0 +1,159 @@
+import math
+import time
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from .smart_fly_class import SmartFlies
+
+STAT_FIELDS = ('generation', 'success_rate', 'best_fitness', 'mean_fitness')
+
+
+class SharedArray:
+    """A NumPy array backed by a named shared memory block that other processes can attach to"""
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def spec(self):
+        # what a child process needs to attach: (name, shape, dtype)
+        return self.shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self, unlink=False):
+        del self.array
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _island_worker(island_i, n_islands, config, specs, barrier, n_epochs, migrate_every, seed):
+    emigrants, emigrant_scores, stats = (SharedArray.attach(spec) for spec in specs)
+    try:
+        smart_flies = SmartFlies(seed=seed + island_i, **config)
+        flies = smart_flies.flies
+        n_migrants = emigrants.shape[1]
+        neighbour = (island_i - 1) % n_islands
+
+        for epoch in range(n_epochs):
+            # the last epoch is cut short so the run ends at n_generations
+            epoch_generations = max(1, min(migrate_every, config['n_generations'] - epoch * migrate_every))
+            for gen_i in range(epoch_generations):
+                smart_flies._run_generation(display=False, victory_lap=False)
+                if gen_i < epoch_generations - 1:
+                    smart_flies._mate()
+
+            # publish this island's best genomes and progress
+            best = np.argpartition(flies.fitness, -n_migrants)[-n_migrants:]
+            emigrants.array[island_i] = flies.flight_path[best]
+            emigrant_scores.array[island_i, :, 0] = flies.fitness[best]
+            emigrant_scores.array[island_i, :, 1] = flies.succeeded[best]
+            stats.array[island_i] = (smart_flies.generation_i, smart_flies.success_rate(),
+                                     flies.fitness.max(), flies.fitness.mean())
+            barrier.wait()
+
+            # ring migration: the neighbour's best replace this island's worst
+            worst = np.argpartition(flies.fitness, n_migrants - 1)[:n_migrants]
+            # migrants keep their fitness and success flag, so successful ones survive _mate unchanged
+            flies.flight_path[worst] = emigrants.array[neighbour]
+            flies.fitness[worst] = emigrant_scores.array[neighbour, :, 0]
+            flies.succeeded[worst] = emigrant_scores.array[neighbour, :, 1]
+            barrier.wait()
+
+            smart_flies._mate()
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        for shared in (emigrants, emigrant_scores, stats):
+            shared.close()
+
+
+def run_islands(n_islands=4, n_flies=200, n_obstacles=4, n_generations=200, mate_rate=0.25, mutate_rate=0.05,
+                lifespan=500, course_dims=(400, 600), migrate_every=10, n_migrants=5, seed=0, report=print,
+                fitness='euclidean', selection='truncation', crossover='uniform'):
+    """Evolve several SmartFlies populations ("islands") in parallel processes on one course
+
+    Every migrate_every generations each island publishes its top n_migrants genomes to shared
+    memory, and each island replaces its worst genomes with those of the previous island (a ring).
+    Only the migrants' int8 genome blocks cross process boundaries, through shared memory.
+
+    :param n_islands: number of populations, one process each
+    :param migrate_every: generations between migrations (the last migration is after generation
+                          n_generations even when it isn't a multiple of migrate_every)
+    :param n_migrants: genomes sent to the next island per migration
+    :param seed: base random seed; island i is seeded with seed + i
+    :param report: called with a dict of aggregate progress after every migration (None to disable)
+    :param fitness: distance metric fitness is scored on ('euclidean' or 'path')
+    :param selection: parent selection operator (see operators.SELECTIONS)
+    :param crossover: crossover operator (see operators.CROSSOVERS)
+    :return: (n_islands, 4) array of the final generation, success_rate, best_fitness, mean_fitness per island
+    """
+    course = SmartFlies(n_flies=1, n_obstacles=n_obstacles, lifespan=lifespan, course_dims=course_dims, seed=seed)
+    config = dict(n_flies=n_flies, n_generations=n_generations, mate_rate=mate_rate, mutate_rate=mutate_rate,
+                  lifespan=lifespan, course_dims=course_dims, target=course.target, obstacles=course.obstacles,
+                  fitness=fitness, selection=selection, crossover=crossover)
+
+    n_migrants = max(1, min(n_migrants, n_flies))
+    n_epochs = max(1, math.ceil(n_generations / migrate_every))
+    emigrants = SharedArray((n_islands, n_migrants, lifespan, 2), 'int8')
+    emigrant_scores = SharedArray((n_islands, n_migrants, 2), 'float64')
+    stats = SharedArray((n_islands, len(STAT_FIELDS)), 'float64')
+    shared_arrays = (emigrants, emigrant_scores, stats)
+    specs = [shared.spec() for shared in shared_arrays]
+
+    # the parent joins the barrier to read progress between the islands' publish and import steps
+    barrier = mp.Barrier(n_islands + 1)
+    workers = [mp.Process(target=_island_worker,
+                          args=(i, n_islands, config, specs, barrier, n_epochs, migrate_every, seed))
+               for i in range(n_islands)]
+    start = time.perf_counter()
+    try:
+        for worker in workers:
+            worker.start()
+        watchdog = threading.Thread(target=_abort_on_failure, args=(workers, barrier), daemon=True)
+        watchdog.start()
+
+        for epoch in range(n_epochs):
+            try:
+                barrier.wait()
+                progress = stats.array.copy()
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                raise RuntimeError('an island process failed')
+
+            if report is not None:
+                elapsed = time.perf_counter() - start
+                report({'generation': int(progress[:, 0].max()),
+                        'best_success_rate': float(progress[:, 1].max()),
+                        'mean_success_rate': float(progress[:, 1].mean()),
+                        'best_fitness': float(progress[:, 2].max()),
+                        'elapsed': round(elapsed, 3),
+                        'generations_per_second': round(float(progress[:, 0].sum()) / elapsed, 3)})
+
+        for worker in workers:
+            worker.join()
+        return progress
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for shared in shared_arrays:
+            shared.close(unlink=True)
+
+
+def _abort_on_failure(workers, barrier):
+    # a worker killed outright can't abort the barrier itself; do it for it
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            if worker.exitcode not in (None, 0):
+                barrier.abort()
+                return
+        time.sleep(0.5)
@@ -0,0 +1,145 @@
+"""Vectorized genetic operators for fly genomes
+
+Every operator works on whole arrays at once and draws its randomness from the
+numpy.random.Generator passed in, so a seeded generator makes a run reproducible.
+
+Selection functions pick parent indices from a breeding pool (the top flies by fitness):
+``select(fitness, pool, size, rng) -> int array of shape size``.
+Crossover functions build children's genomes:
+``crossover(genomes, n_children, select, rng) -> (n_children, lifespan, 2) genes``,
+where ``select(size)`` returns parent indices.
+"""
+import numpy as np
+
+GENE_MIN, GENE_MAX = -5, 5
+
+
+def top_k(fitness, k):
+    """Indices of the k fittest flies (unordered), in O(n) with argpartition"""
+    k = max(1, min(k, len(fitness)))
+    return np.argpartition(fitness, len(fitness) - k)[len(fitness) - k:]
+
+
+def alias_table(weights):
+    """Walker/Vose alias table for drawing indices in proportion to weights in O(1) each
+
+    :return: (accept, alias) so index i is kept with probability accept[i] and otherwise
+             replaced by alias[i]
+    """
+    scaled = np.asarray(weights, dtype='float64')
+    scaled = scaled * (len(scaled) / scaled.sum())
+    accept = np.ones(len(scaled))
+    alias = np.arange(len(scaled))
+    small = [i for i in range(len(scaled)) if scaled[i] < 1]
+    large = [i for i in range(len(scaled)) if scaled[i] >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        accept[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+    return accept, alias
+
+
+def weighted_choice(pool, weights, size, rng):
+    """Draw from pool in proportion to weights (uniformly if they are all zero)"""
+    if not np.any(weights > 0):
+        return pool[rng.integers(len(pool), size=size)]
+    accept, alias = alias_table(weights)
+    i = rng.integers(len(pool), size=size)
+    keep = rng.random(size, dtype='float32') < accept[i]
+    return pool[np.where(keep, i, alias[i])]
+
+
+def truncation_selection(fitness, pool, size, rng):
+    """Every pool member is equally likely to be a parent"""
+    return pool[rng.integers(len(pool), size=size)]
+
+
+def roulette_selection(fitness, pool, size, rng):
+    """Parents are picked in proportion to their fitness"""
+    return weighted_choice(pool, np.clip(fitness[pool], 0, None), size, rng)
+
+
+def _pool_ranks(fitness, pool):
+    # 1 for the least fit pool member up to len(pool) for the fittest
+    ranks = np.empty(len(pool))
+    ranks[np.argsort(fitness[pool], kind='stable')] = np.arange(1, len(pool) + 1)
+    return ranks
+
+
+def rank_selection(fitness, pool, size, rng):
+    """Parents are picked in proportion to their fitness rank within the pool (1 for the worst)"""
+    return weighted_choice(pool, _pool_ranks(fitness, pool), size, rng)
+
+
+def tournament_selection(fitness, pool, size, rng, tournament_size=3):
+    """Each parent is the fittest of tournament_size random pool members (drawn with replacement)
+
+    Rather than running the tournaments, parents are drawn from the distribution of their winners:
+    the pool member ranked r of k wins with probability (r^t - (r - 1)^t) / k^t.
+    """
+    ranks = _pool_ranks(fitness, pool)
+    return weighted_choice(pool, ranks ** tournament_size - (ranks - 1) ** tournament_size, size, rng)
+
+
+def _gene_view(genomes):
+    # each (x, y) int8 gene as a single int16, so genes are gathered and blended in one op
+    return genomes.view('int16')[..., 0]
+
+
+def pool_crossover(genomes, n_children, select, rng):
+    """Every gene of every child comes from its own randomly selected parent
+
+    The original mating scheme, kept for its behaviour: it draws a parent per gene (lifespan
+    times as many as the two-parent crossovers), so it is several times slower than
+    uniform_crossover (the default) for large populations.
+    """
+    lifespan = genomes.shape[1]
+    parents = select((n_children, lifespan))
+    genes = np.take(_gene_view(genomes), parents * lifespan + np.arange(lifespan))
+    return genes[..., np.newaxis].view('int8')
+
+
+def uniform_crossover(genomes, n_children, select, rng):
+    """Two parents per child; each gene is taken from either one with equal chance"""
+    lifespan = genomes.shape[1]
+    parents = select((n_children, 2))
+    coin_flips = rng.integers(0, 256, size=(n_children, -(-lifespan // 8)), dtype='uint8')
+    from_first = np.unpackbits(coin_flips, axis=1, count=lifespan).view(bool)
+    genes = _gene_view(genomes)
+    return np.where(from_first, genes[parents[:, 0]], genes[parents[:, 1]])[..., np.newaxis].view('int8')
+
+
+def segment_crossover(genomes, n_children, select, rng):
+    """Two parents per child; a random contiguous segment of genes comes from the second parent"""
+    lifespan = genomes.shape[1]
+    parents = select((n_children, 2))
+    cuts = np.sort(rng.integers(lifespan + 1, size=(n_children, 2)), axis=1)
+    gene_i = np.arange(lifespan)
+    in_segment = (cuts[:, :1] <= gene_i) & (gene_i < cuts[:, 1:])
+    genes = _gene_view(genomes)
+    return np.where(in_segment, genes[parents[:, 1]], genes[parents[:, 0]])[..., np.newaxis].view('int8')
+
+
+def mutate(genes, rate, rng):
+    """Add random noise to about a rate fraction of the genes (x and y velocities mutate independently)
+
+    Only the mutated positions are drawn: a binomial count of them, at uniform random positions.
+    """
+    mutated = genes.copy()
+    flat = mutated.reshape(-1)
+    positions = rng.integers(flat.size, size=rng.binomial(flat.size, rate))
+    noise = rng.integers(GENE_MIN, GENE_MAX + 1, size=len(positions), dtype='int8')
+    flat[positions] = np.clip(flat[positions] + noise, GENE_MIN, GENE_MAX)
+    return mutated
+
+
+SELECTIONS = {'truncation': truncation_selection,
+              'tournament': tournament_selection,
+              'roulette': roulette_selection,
+              'rank': rank_selection}
+
+CROSSOVERS = {'pool': pool_crossover,
+              'uniform': uniform_crossover,
+              'segment': segment_crossover}
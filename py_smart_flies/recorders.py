@@ -0,0 +1,28 @@
+import os
+import csv
+import json
+
+
+class MetricsWriter:
+    """Stream one row of metrics per generation to a .csv or .jsonl file
+
+    Rows are flushed as they are written so a long run can be followed (or killed) at any time.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = os.path.splitext(path)[1].lower() == '.csv'
+        self.file = open(path, 'w', newline='')
+        self.csv_writer = None
+
+    def write(self, row):
+        if self.is_csv:
+            if self.csv_writer is None:
+                self.csv_writer = csv.DictWriter(self.file, fieldnames=list(row))
+                self.csv_writer.writeheader()
+            self.csv_writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
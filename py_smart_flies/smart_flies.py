@@ -1,24 +1,116 @@
+"""Smart flies genetic algorithm (`misc-sims flies` or `python -m py_smart_flies.smart_flies`)
+
+Only argparse is imported at module level; OpenCV, NumPy and the simulation modules are
+imported by main() once the arguments have been parsed.
+"""
 import argparse
-from smart_fly_class import SmartFlies
-
-ap = argparse.ArgumentParser()
-ap.add_argument('-f', '--nFlies', type=int, default=200, help='Number of flies to create')
-ap.add_argument('-o', '--nObstacles', type=int, default=4, help='Number of obstacles')
-ap.add_argument('-g', '--nGenerations', type=int, default=200, help='Number of generations')
-ap.add_argument('-l', '--lifespan', type=int, default=500, help='Number of frames per generation')
-ap.add_argument('-u', '--mutateRate', type=float, default=0.05, help='Percent chance of a gene mutating')
-ap.add_argument('-m', '--mateRate', type=float, default=0.25,
-                help='Top percentage of flies to be pass genes to next generation')
-args = vars(ap.parse_args())
-
-smart_flies = SmartFlies(n_flies=args['nFlies'],
-                         n_obstacles=args['nObstacles'],
-                         n_generations=args['nGenerations'],
-                         mate_rate=args['mutateRate'],
-                         mutate_rate=args['mateRate'],
-                         lifespan=args['lifespan'])
-
-smart_flies.find_light()
-
-print('\n\n*{}% Success Rate* after *{} Generations*\n\n'.format(smart_flies.success_rate(),
-                                                                 smart_flies.generation_i))
+
+DEFAULT_GENERATIONS = 200
+
+# per-run outputs the single-population loop supports but run_islands doesn't
+ISLAND_UNSUPPORTED = ('--gif', '--renderEvery', '--metrics', '--checkpoint', '--resume', '--profile', '--profileOut')
+
+
+def add_arguments(ap):
+    ap.add_argument('-f', '--nFlies', type=int, default=200, help='Number of flies to create')
+    ap.add_argument('-o', '--nObstacles', type=int, default=4, help='Number of obstacles')
+    ap.add_argument('-g', '--nGenerations', type=int,
+                    help='Number of generations (default {}; with --resume, the checkpointed run\'s)'.format(
+                        DEFAULT_GENERATIONS))
+    ap.add_argument('-l', '--lifespan', type=int, default=500, help='Number of frames per generation')
+    ap.add_argument('-u', '--mutateRate', type=float, default=0.05, help='Percent chance of a gene mutating')
+    ap.add_argument('-m', '--mateRate', type=float, default=0.25,
+                    help='Top percentage of flies to be pass genes to next generation')
+    ap.add_argument('--fitness', choices=('euclidean', 'path'), default='euclidean',
+                    help='Score flies on straight-line distance to the target or on the path distance around obstacles')
+    ap.add_argument('--headless', action='store_true', help='Evolve without drawing or opening a window')
+    ap.add_argument('-r', '--renderEvery', type=int,
+                    help='With --gif, also record every nth generation (the victory lap is always recorded)')
+    ap.add_argument('--gif', help='Path to record generations to as a GIF')
+    ap.add_argument('--metrics', help='Path to stream per-generation metrics to (.csv or .jsonl)')
+    ap.add_argument('-i', '--islands', type=int,
+                    help='Evolve this many populations in parallel processes with migration (always headless)')
+    ap.add_argument('--migrateEvery', type=int, default=10, help='(islands) Generations between migrations')
+    ap.add_argument('--migrants', type=int, default=5, help='(islands) Top genomes sent to the next island')
+    ap.add_argument('-s', '--seed', type=int, help='Random seed for a reproducible run (islands use seed + i)')
+    ap.add_argument('--selection', choices=('truncation', 'tournament', 'roulette', 'rank'), default='truncation',
+                    help='How parents are picked from the top mateRate of flies')
+    ap.add_argument('--crossover', choices=('pool', 'uniform', 'segment'), default='uniform',
+                    help='How parent genes are combined: per gene from two parents, a segment from a second '
+                         'parent, or a random parent per gene (the original behaviour; several times slower)')
+    ap.add_argument('--checkpoint', help='Directory to periodically checkpoint the run to')
+    ap.add_argument('--checkpointEvery', type=int, default=10, help='Generations between checkpoints')
+    ap.add_argument('--resume', help='Checkpoint directory to resume a run from (course and rates come from it; '
+                                     'evolution continues until --nGenerations if given)')
+    ap.add_argument('--profile', action='store_true',
+                    help='Time each frame\'s phases and draw FPS and ms per phase on the drawn frames')
+    ap.add_argument('--profileOut', help='Path to write per-phase timing stats and histograms (JSON) to at the end')
+    return ap
+
+
+def main(args):
+    from misc_sims.instrument import NULL_INSTRUMENT, Instrument
+    from .islands import run_islands
+    from .smart_fly_class import SmartFlies
+
+    instrument = NULL_INSTRUMENT
+    if args['profile'] or args['profileOut']:
+        instrument = Instrument(overlay=args['profile'])
+
+    n_generations = args['nGenerations']
+    if n_generations is None and not args['resume']:
+        n_generations = DEFAULT_GENERATIONS
+
+    if args['islands']:
+        unsupported = [flag for flag in ISLAND_UNSUPPORTED if args[flag.lstrip('-')]]
+        if unsupported:
+            raise SystemExit('{} can\'t be used with --islands'.format(', '.join(unsupported)))
+        final = run_islands(n_islands=args['islands'],
+                            n_flies=args['nFlies'],
+                            n_obstacles=args['nObstacles'],
+                            n_generations=n_generations,
+                            mate_rate=args['mateRate'],
+                            mutate_rate=args['mutateRate'],
+                            lifespan=args['lifespan'],
+                            migrate_every=args['migrateEvery'],
+                            n_migrants=args['migrants'],
+                            seed=args['seed'] or 0,
+                            report=print,
+                            fitness=args['fitness'],
+                            selection=args['selection'],
+                            crossover=args['crossover'])
+        print('\n\n*{}% Best Island Success Rate* after *{} Generations*\n\n'.format(int(final[:, 1].max()),
+                                                                                     int(final[:, 0].max())))
+        return
+
+    if args['resume']:
+        smart_flies = SmartFlies.from_checkpoint(args['resume'], n_generations=n_generations,
+                                                 instrument=instrument)
+    else:
+        smart_flies = SmartFlies(n_flies=args['nFlies'],
+                                 n_obstacles=args['nObstacles'],
+                                 n_generations=n_generations,
+                                 mate_rate=args['mateRate'],
+                                 mutate_rate=args['mutateRate'],
+                                 lifespan=args['lifespan'],
+                                 fitness=args['fitness'],
+                                 seed=args['seed'],
+                                 selection=args['selection'],
+                                 crossover=args['crossover'],
+                                 instrument=instrument)
+
+    smart_flies.find_light(headless=args['headless'],
+                           render_every=args['renderEvery'],
+                           gif_path=args['gif'],
+                           metrics_path=args['metrics'],
+                           checkpoint_path=args['checkpoint'],
+                           checkpoint_every=args['checkpointEvery'])
+    if args['profileOut']:
+        instrument.export(args['profileOut'])
+
+    print('\n\n*{}% Success Rate* after *{} Generations*\n\n'.format(smart_flies.success_rate(),
+                                                                     smart_flies.generation_i))
+
+
+if __name__ == '__main__':
+    main(vars(add_arguments(argparse.ArgumentParser()).parse_args()))
@@ -1,14 +1,34 @@
-import random
+import time
 import cv2
 import numpy as np
-from fly_class import Fly
+from misc_sims.frame_writers import GifFrameWriter
+from misc_sims.instrument import NULL_INSTRUMENT
+from .fly_class import Population
+from .operators import CROSSOVERS, SELECTIONS, mutate, top_k
+from .checkpoint import CheckpointWriter, load_checkpoint
+from .recorders import MetricsWriter
 
 
 class SmartFlies:
     def __init__(self, n_flies=50, n_obstacles=1, n_generations=10, mate_rate=0.25, mutate_rate=0.05,
-                 lifespan=500, course_dims=(400, 600)):
-        self.target = (np.random.randint(5, course_dims[0] - 5),
-                       np.random.randint(5, 30))
+                 lifespan=500, course_dims=(400, 600), target=None, obstacles=None, fitness='euclidean',
+                 seed=None, selection='truncation', crossover='uniform', flight_path=None,
+                 instrument=NULL_INSTRUMENT):
+        if selection not in SELECTIONS:
+            raise ValueError('unknown selection {!r}; choose from {}'.format(selection, ', '.join(SELECTIONS)))
+        if crossover not in CROSSOVERS:
+            raise ValueError('unknown crossover {!r}; choose from {}'.format(crossover, ', '.join(CROSSOVERS)))
+        # every random draw of the course and the evolution comes from this one generator
+        self.rng = np.random.default_rng(seed)
+        self.selection = selection
+        self.crossover = crossover
+        # timing spans per frame (a misc_sims.instrument.Instrument); a no-op by default
+        self.instrument = instrument
+
+        if target is None:
+            target = (self.rng.integers(5, course_dims[0] - 5),
+                      self.rng.integers(5, 30))
+        self.target = tuple(int(v) for v in target)
         self.n_flies = n_flies
         self.n_obstacles = n_obstacles
         self.n_generations = n_generations
@@ -17,9 +37,18 @@ class SmartFlies:
         self.lifespan = lifespan
         self.course_dims = course_dims
 
-        self.obstacles = self._gen_obstacles()
+        if obstacles is None:
+            obstacles = self._gen_obstacles()
+        self.obstacles = obstacles
+        self.n_obstacles = len(obstacles)
         self.course = self._create_course()
-        self.flies = [Fly(course_dims, self.target, self.obstacles, lifespan) for _ in range(n_flies)]
+        self.frame = np.empty_like(self.course)
+        # the course with flies that stopped this generation baked in
+        self.static_layer = self.course.copy()
+        # genome hash -> outcome of the last generation, to skip re-simulating unchanged genomes
+        self.outcome_cache = {}
+        self.flies = Population(n_flies, course_dims, self.target, self.obstacles, lifespan,
+                                fitness=fitness, rng=self.rng, flight_path=flight_path)
         self.generation_i = 0
         self.victory_lap_i = -1
 
@@ -49,72 +78,210 @@ class SmartFlies:
 
         obstacles = []
         for _ in range(self.n_obstacles):
-            x, y, w, h = (np.random.randint(*r) for r in [x_range, y_range, w_range, h_range])
-            obstacles.append([(x, y), ((x + w), (y + h))])
+            x, y, w, h = (self.rng.integers(*r) for r in [x_range, y_range, w_range, h_range])
+            obstacles.append([(int(x), int(y)), (int(x + w), int(y + h))])
         return obstacles
 
-    def _run_generation(self):
+    def _draw_overlay(self):
+        np.copyto(self.frame, self.static_layer)
+        cv2.putText(self.frame,
+                    'Generation {}'.format(self.generation_i),
+                    (10, self.course_dims[1] - 40), cv2.FONT_HERSHEY_SIMPLEX, .5, (255, 255, 255), 2)
+        cv2.putText(self.frame,
+                    'Success Rate: {}%'.format(self.success_rate()),
+                    (10, self.course_dims[1] - 20), cv2.FONT_HERSHEY_SIMPLEX, .5, (255, 255, 255), 2)
+        return self.frame
+
+    def _replay_cached(self):
+        # fitness only depends on the genome and the (static) course, so genomes simulated last
+        # generation (e.g. successful flies kept by _mate) are retired straight to their outcome
+        hashes = self.flies.genome_hashes()
+        cached = [i for i, genome_hash in enumerate(hashes) if genome_hash in self.outcome_cache]
+        if cached:
+            locations, arrival_steps = zip(*(self.outcome_cache[hashes[i]] for i in cached))
+            self.flies.replay(np.array(cached), np.array(locations), np.array(arrival_steps))
+        return hashes
+
+    def _run_generation(self, display=True, recorder=None, victory_lap=True):
+        is_victory_lap = (self.victory_lap_i - 1) == self.generation_i
+        draw = display or recorder is not None
+        instrument = self.instrument
+
+        # memoize in headless runs only, so every fly is still seen flying when drawing
+        hashes = None
+        if draw:
+            np.copyto(self.static_layer, self.course)
+        else:
+            with instrument.span('replay'):
+                hashes = self._replay_cached()
+
         for frame in range(self.lifespan):
-            course_clone = self.course.copy()
-            cv2.putText(course_clone,
-                        'Generation {}'.format(self.generation_i),
-                        (10, self.course_dims[1] - 40), cv2.FONT_HERSHEY_SIMPLEX, .5, (255, 255, 255), 2)
-            cv2.putText(course_clone,
-                        'Success Rate: {}%'.format(self.success_rate()),
-                        (10, self.course_dims[1] - 20), cv2.FONT_HERSHEY_SIMPLEX, .5, (255, 255, 255), 2)
+            with instrument.span('update'):
+                retired = self.flies.update()
+            instrument.count('active flies', len(self.flies.active))
 
-            for fly in self.flies:
-                fly.update()
-                is_victory_lap = (self.victory_lap_i - 1) == self.generation_i
-                fly.show(course_clone, victory_lap=is_victory_lap)
+            if draw:
+                with instrument.span('draw'):
+                    if not is_victory_lap:
+                        self.flies.show(self.static_layer, flies=retired)
+                    course_clone = self._draw_overlay()
+                    self.flies.show(course_clone, victory_lap=is_victory_lap,
+                                    flies=None if is_victory_lap else self.flies.active)
+                instrument.draw_overlay(course_clone)
+                if recorder is not None:
+                    with instrument.span('record'):
+                        recorder.write(course_clone)
 
-            cv2.imshow('Smart Flies (Esc to Quit)', course_clone)
-            key = cv2.waitKey(1)
+            if display:
+                with instrument.span('display'):
+                    cv2.imshow('Smart Flies (Esc to Quit)', course_clone)
+                    key = cv2.waitKey(1)
+                if key == 27:
+                    return 'stop early'
+            instrument.tick()
 
-            if key == 27 or self.victory_lap_i == self.generation_i:
-                return 'stop early'
+            if victory_lap:
+                if self.victory_lap_i == self.generation_i:
+                    return 'stop early'
 
-            if self.victory_lap_i == -1 and self.success_rate() == 100:
-                self.victory_lap_i = self.generation_i + 2
+                if self.victory_lap_i == -1 and self.success_rate() == 100:
+                    self.victory_lap_i = self.generation_i + 2
 
-        for fly in self.flies:
-            fly.evaluate_fitness()
+            # every fly has stopped or arrived; nothing changes for the rest of the lifespan
+            if not len(self.flies.active):
+                break
+
+        with instrument.span('fitness'):
+            self.flies.evaluate_fitness()
+        if hashes is not None:
+            locations, arrival_steps = self.flies.outcomes(slice(None))
+            self.outcome_cache = dict(zip(hashes, zip(locations, arrival_steps)))
 
         self.generation_i += 1
 
         return None
 
-    def _mutation(self, v):
-        if np.random.rand() < self.mutate_rate:
-            noise = np.random.randint(-5, 6)
-            v += noise
-            if v < -5:
-                v = -5
-            if v > 5:
-                v = 5
-        return v
+    def _mutation(self, genes):
+        return mutate(genes, self.mutate_rate, self.rng)
 
     def _mate(self):
-        n = int(self.n_flies * self.mate_rate)
-        fitnesses = [fly.fitness for fly in self.flies]
-        top_n_fly_inds = sorted(range(len(fitnesses)), key=lambda i: fitnesses[i])[-n:]
-
-        for fly in self.flies:
-            if not fly.succeeded:
-                for i in range(self.lifespan):
-                    parent = self.flies[random.choice(top_n_fly_inds)]
-                    new_x = self._mutation(parent.flight_path[i][0])
-                    new_y = self._mutation(parent.flight_path[i][1])
-
-                    fly.flight_path[i] = np.array([new_x, new_y], dtype='int')
-            fly.reset()
-
-    def find_light(self):
-        for gen_i in range(self.n_generations):
-            stop = self._run_generation()
-            if stop:
-                break
-            self._mate()
+        with self.instrument.span('mate'):
+            # the top mate_rate of flies form the breeding pool; the selection operator weighs them
+            fitness = self.flies.fitness
+            pool = top_k(fitness, int(self.n_flies * self.mate_rate))
+            select = SELECTIONS[self.selection]
+
+            # successful flies survive unchanged, every other fly is replaced by a child
+            children = np.flatnonzero(self.flies.succeeded == 0)
+            genes = CROSSOVERS[self.crossover](self.flies.flight_path, len(children),
+                                               lambda size: select(fitness, pool, size, self.rng), self.rng)
+            self.flies.flight_path[children] = self._mutation(genes)
+
+            self.flies.reset()
+
+    def _should_record(self, render_every):
+        if (self.victory_lap_i - 1) == self.generation_i:
+            return True
+        return bool(render_every) and self.generation_i % render_every == 0
+
+    def find_light(self, headless=False, render_every=None, gif_path=None, metrics_path=None,
+                   checkpoint_path=None, checkpoint_every=10):
+        """Evolve the flies until generation n_generations (continuing from generation_i when resumed)
+
+        :param headless: skip all drawing and GUI calls (except frames recorded to gif_path)
+        :param render_every: with gif_path, record every nth generation
+        :param gif_path: optional GIF to record the victory lap (and every render_every-th generation) to
+        :param metrics_path: optional .csv or .jsonl file to stream per-generation metrics to
+        :param checkpoint_path: optional directory to checkpoint to in the background
+        :param checkpoint_every: generations between checkpoints (a final one is written at the end)
+        """
+        recorder = GifFrameWriter(gif_path, fps=30) if gif_path else None
+        metrics = MetricsWriter(metrics_path) if metrics_path else None
+        checkpoints = CheckpointWriter(checkpoint_path) if checkpoint_path else None
+        run_start = time.perf_counter()
+        try:
+            while self.generation_i < self.n_generations:
+                gen_start = time.perf_counter()
+                record = recorder is not None and self._should_record(render_every)
+                stop = self._run_generation(display=not headless, recorder=recorder if record else None)
+                if stop:
+                    break
+
+                if metrics is not None:
+                    now = time.perf_counter()
+                    metrics.write(self.generation_metrics(now - gen_start, now - run_start))
+                self._mate()
+
+                if checkpoints is not None and self.generation_i % checkpoint_every == 0:
+                    checkpoints.save(*self.checkpoint_state())
+            if checkpoints is not None:
+                checkpoints.save(*self.checkpoint_state())
+        finally:
+            if recorder is not None:
+                recorder.close()
+            if metrics is not None:
+                metrics.close()
+            if checkpoints is not None:
+                checkpoints.close()
+
+    def checkpoint_state(self):
+        """(meta, arrays) snapshot of the run between generations, for checkpoint.save_checkpoint"""
+        meta = {'generation_i': self.generation_i,
+                'victory_lap_i': self.victory_lap_i,
+                'n_flies': self.n_flies,
+                'n_generations': self.n_generations,
+                'mate_rate': self.mate_rate,
+                'mutate_rate': self.mutate_rate,
+                'lifespan': self.lifespan,
+                'course_dims': list(self.course_dims),
+                'target': list(self.target),
+                'obstacles': [[list(p0), list(p1)] for p0, p1 in self.obstacles],
+                'fitness': self.flies.fitness_metric,
+                'selection': self.selection,
+                'crossover': self.crossover,
+                'rng_state': self.rng.bit_generator.state}
+        flies = self.flies
+        arrays = {name: getattr(flies, name).copy()
+                  for name in ('flight_path', 'fitness', 'succeeded', 'success_speed', 'color')}
+        return meta, arrays
+
+    @classmethod
+    def from_checkpoint(cls, path, n_generations=None, instrument=NULL_INSTRUMENT):
+        """Resume a run from the newest checkpoint in path
+
+        :param n_generations: generation to run until (the checkpointed run's target if None)
+        :param instrument: see SmartFlies.instrument
+        """
+        meta, arrays = load_checkpoint(path)
+        smart_flies = cls(n_flies=meta['n_flies'],
+                          n_generations=meta['n_generations'] if n_generations is None else n_generations,
+                          mate_rate=meta['mate_rate'],
+                          mutate_rate=meta['mutate_rate'],
+                          lifespan=meta['lifespan'],
+                          course_dims=tuple(meta['course_dims']),
+                          target=meta['target'],
+                          obstacles=[[tuple(p0), tuple(p1)] for p0, p1 in meta['obstacles']],
+                          fitness=meta['fitness'],
+                          selection=meta['selection'],
+                          crossover=meta['crossover'],
+                          flight_path=arrays.pop('flight_path'),
+                          instrument=instrument)
+        for name, array in arrays.items():
+            getattr(smart_flies.flies, name)[:] = array
+        smart_flies.rng.bit_generator.state = meta['rng_state']
+        smart_flies.generation_i = meta['generation_i']
+        smart_flies.victory_lap_i = meta['victory_lap_i']
+        return smart_flies
+
+    def generation_metrics(self, wall_time, elapsed):
+        """Metrics for the generation that just finished (call before _mate resets fitness)"""
+        fitness = self.flies.fitness
+        return {'generation': self.generation_i - 1,
+                'success_rate': self.success_rate(),
+                'best_fitness': float(fitness.max()),
+                'mean_fitness': float(fitness.mean()),
+                'wall_time': round(wall_time, 6),
+                'elapsed': round(elapsed, 6)}
 
     def success_rate(self):
-        return 100 * sum(fly.succeeded for fly in self.flies) // self.n_flies
+        return self.flies.success_rate()
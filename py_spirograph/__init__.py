@@ -0,0 +1 @@
+"""Random spirograph drawings, animations, posters and galleries"""
@@ -0,0 +1,92 @@
+"""Incremental spirograph animation frames and streaming GIF/video export"""
+import math
+import cv2
+import numpy as np
+from misc_sims.frame_writers import open_frame_writer
+from .trajectory import circle_centers, spiro_times
+
+
+class SpiroAnimator:
+    """Yield the frames of a spirograph animation, redrawing only what changed
+
+    The pen's trail lives on a persistent canvas and each frame is another persistent buffer:
+    per frame the areas under the previous frame's circles are restored from the canvas, the new
+    pen segments are drawn on both, and the circles are drawn on the frame. No frame is copied
+    in full.
+
+    :param radii, speeds, pos: see utils.draw_spirograph
+    :param canvas_size: the size of the canvas to draw on
+    :param every: curve steps per frame (frame decimation)
+    :param max_frames: if set, raise every so the closed curve takes at most this many frames
+    """
+    def __init__(self, radii, speeds, pos=(), canvas_size=(600, 600),
+                 draw_color=(200, 125, 150), circle_color=(150, 100, 200), every=1, max_frames=None):
+        self.radii = list(radii)
+        self.draw_color = draw_color
+        self.circle_color = circle_color
+
+        center = (canvas_size[1] // 2, canvas_size[0] // 2)
+        self.centers = np.round(circle_centers(radii, speeds, pos, t=spiro_times(speeds),
+                                               center=center)).astype('int32')
+        self.pen = np.ascontiguousarray(self.centers[:, -1])
+        if max_frames:
+            every = max(every, math.ceil((len(self.centers) - 1) / max_frames))
+        self.every = every
+
+        self.canvas = np.zeros(canvas_size + (3,), dtype='uint8') + 50
+        self.frame = self.canvas.copy()
+        self.dirty = []
+
+    def _frame_steps(self):
+        # every curve step shown, ending on the one that closes the curve
+        last = len(self.centers) - 1
+        steps = list(range(0, last + 1, self.every))
+        if steps[-1] != last:
+            steps.append(last)
+        return steps
+
+    def __len__(self):
+        return len(self._frame_steps())
+
+    def _circle_boxes(self, step_centers):
+        height, width = self.frame.shape[:2]
+        for (x, y), radius in zip(step_centers.tolist(), self.radii):
+            x0, y0 = max(x - radius - 1, 0), max(y - radius - 1, 0)
+            x1, y1 = min(x + radius + 2, width), min(y + radius + 2, height)
+            if x0 < x1 and y0 < y1:
+                yield slice(y0, y1), slice(x0, x1)
+
+    def __iter__(self):
+        prev_step = 0
+        for step in self._frame_steps():
+            for box in self.dirty:
+                self.frame[box] = self.canvas[box]
+
+            # pen segments since the last frame
+            pen = self.pen[prev_step:step + 1]
+            for image in (self.canvas, self.frame):
+                image[pen[-1, 1], pen[-1, 0]] = self.draw_color
+                cv2.polylines(image, [pen], False, self.draw_color, 1)
+            prev_step = step
+
+            step_centers = self.centers[step]
+            for (x, y), radius in zip(step_centers.tolist(), self.radii):
+                cv2.circle(self.frame, (x, y), radius, self.circle_color, thickness=1)
+            self.dirty = list(self._circle_boxes(step_centers))
+
+            yield self.frame
+
+
+def export_animation(radii, speeds, output, pos=(), canvas_size=(600, 600), fps=30, every=1, max_frames=None,
+                     draw_color=(200, 125, 150), circle_color=(150, 100, 200)):
+    """Write the spirograph animation to a .gif or video file, one frame at a time
+
+    :param every: curve steps per frame
+    :param max_frames: if set, decimate so the closed curve takes at most this many frames
+    :return: the finished drawing (without circles)
+    """
+    animator = SpiroAnimator(radii, speeds, pos, canvas_size, draw_color, circle_color, every, max_frames)
+    with open_frame_writer(output, fps, frame_size=canvas_size[::-1]) as writer:
+        for frame in animator:
+            writer.write(frame)
+    return animator.canvas
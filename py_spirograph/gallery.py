@@ -0,0 +1,153 @@
+"""Batch-render a gallery of seeded random spirographs into contact sheets
+
+Each seed gives a configuration (see utils.random_config). Duplicate and degenerate
+configurations are found from their parameters alone and skipped before rendering; the rest
+are rendered as thumbnails across a process pool and tiled into contact sheets. A JSONL
+manifest records every seed, its parameters and where its thumbnail ended up, so any image
+can be reproduced with `misc-sims spiro --seed`. Run with `python -m py_spirograph.gallery`.
+"""
+import os
+import json
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+import cv2
+import numpy as np
+from .poster import SUBPIXEL_BITS, poster_path
+from .trajectory import MAX_DENOMINATOR, arm_lengths
+from .spirograph import str_2_bool
+from .utils import random_config
+
+
+def canonical_key(radii, speeds, pos=(), precision=3):
+    """A key that is equal for configurations drawing the same shape, or None if degenerate
+
+    The pen path is a sum of rotating terms (arm length, angular speed). Terms with zero length
+    or zero speed only move the curve, and terms sharing a speed add up, so they are merged
+    away; a curve with fewer than two terms left is a circle or a point (degenerate). The
+    remaining terms are normalized for overall size (arm lengths relative to the longest),
+    drawing speed (speeds as coprime integer multiples of their common divisor), mirroring
+    (the longest arm turns counter-clockwise) and 180 degree rotation (the longest arm is
+    positive).
+    """
+    terms = {}
+    for speed, arm in zip(speeds, arm_lengths(radii, pos)):
+        speed = Fraction(speed).limit_denominator(MAX_DENOMINATOR)
+        if speed and arm:
+            terms[speed] = terms.get(speed, 0) + float(arm)
+    terms = {speed: arm for speed, arm in terms.items() if abs(arm) > 1e-9}
+    if len(terms) < 2:
+        return None
+
+    numerator = math.gcd(*(s.numerator for s in terms))
+    denominator = math.lcm(*(s.denominator for s in terms))
+    longest_speed, longest_arm = max(terms.items(), key=lambda term: abs(term[1]))
+    direction = 1 if longest_speed > 0 else -1
+    scale = longest_arm
+
+    return tuple(sorted((int(speed * denominator / numerator) * direction, round(arm / scale, precision))
+                        for speed, arm in terms.items()))
+
+
+def gallery_entries(n_configs, start_seed=0, n_circles=3, random_pos=False):
+    """Manifest entries for seeds start_seed ... start_seed + n_configs - 1
+
+    Each entry has the seed, its configuration and a status: 'render', 'degenerate', or
+    'duplicate' (with duplicate_of, the first seed with the same canonical_key).
+    """
+    seen = {}
+    for seed in range(start_seed, start_seed + n_configs):
+        config = random_config(seed, n_circles, random_pos)
+        entry = dict(seed=seed, n_circles=n_circles, random_pos=random_pos, **config)
+        key = canonical_key(config['radii'], config['speeds'], config['pos'])
+        if key is None:
+            entry['status'] = 'degenerate'
+        elif key in seen:
+            entry['status'] = 'duplicate'
+            entry['duplicate_of'] = seen[key]
+        else:
+            seen[key] = seed
+            entry['status'] = 'render'
+        yield entry
+
+
+def render_thumbnail(entry, size=160, draw_color=(200, 125, 150), background=50):
+    """Render an entry's curve scaled to fill a size x size anti-aliased thumbnail"""
+    path = poster_path(entry['radii'], entry['speeds'], entry['pos'], size, max_segment=2, margin=0.05)
+    thumbnail = np.full((size, size, 3), background, dtype='uint8')
+    fixed_path = np.round(path * (1 << SUBPIXEL_BITS)).astype('int32')
+    cv2.polylines(thumbnail, [fixed_path], False, draw_color, 1, cv2.LINE_AA, SUBPIXEL_BITS)
+    return thumbnail
+
+
+def _render_entry(args):
+    entry, size = args
+    return render_thumbnail(entry, size)
+
+
+def run_gallery(output_dir, n_configs=1000, start_seed=0, n_circles=3, random_pos=False,
+                thumb_size=160, cols=10, rows=10, workers=None):
+    """Render a gallery into output_dir as sheet_NNNN.png contact sheets plus manifest.jsonl
+
+    :param workers: number of rendering processes (os.cpu_count() if None)
+    :return: dict counting entries by status
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    entries = list(gallery_entries(n_configs, start_seed, n_circles, random_pos))
+    to_render = [entry for entry in entries if entry['status'] == 'render']
+    per_sheet = cols * rows
+    label_height = 14
+
+    with ProcessPoolExecutor(workers) as pool:
+        # results arrive in order, so each sheet is written (and dropped) as soon as it fills
+        thumbnails = pool.map(_render_entry, ((entry, thumb_size) for entry in to_render), chunksize=8)
+        sheet = None
+        for i, (entry, thumbnail) in enumerate(zip(to_render, thumbnails)):
+            cell = i % per_sheet
+            if cell == 0:
+                sheet = np.zeros((rows * (thumb_size + label_height), cols * thumb_size, 3), dtype='uint8')
+                sheet_name = 'sheet_{:04d}.png'.format(i // per_sheet)
+
+            y = (cell // cols) * (thumb_size + label_height)
+            x = (cell % cols) * thumb_size
+            sheet[y:y + thumb_size, x:x + thumb_size] = thumbnail
+            cv2.putText(sheet, 'seed {}'.format(entry['seed']), (x + 4, y + thumb_size + label_height - 3),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.35, (200, 200, 200), 1)
+            entry['sheet'] = sheet_name
+            entry['cell'] = cell
+
+            if cell == per_sheet - 1 or i == len(to_render) - 1:
+                cv2.imwrite(os.path.join(output_dir, sheet_name), sheet)
+
+    with open(os.path.join(output_dir, 'manifest.jsonl'), 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+
+    counts = {}
+    for entry in entries:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    return counts
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-o', '--outputDir', type=str, default='gallery',
+                    help='directory to write contact sheets and manifest.jsonl to')
+    ap.add_argument('-g', '--nConfigs', type=int, default=1000,
+                    help='number of seeded configurations to generate')
+    ap.add_argument('--startSeed', type=int, default=0,
+                    help='first seed; seeds startSeed ... startSeed + nConfigs - 1 are used')
+    ap.add_argument('-n', '--nCircles', type=int, default=3,
+                    help='number of circles in each spirograph')
+    ap.add_argument('-p', '--randomPos', type=str_2_bool, default='f',
+                    help='randomize whether circles are draw inside or outside of parent?')
+    ap.add_argument('-t', '--thumbSize', type=int, default=160, help='thumbnail width/height in pixels')
+    ap.add_argument('--cols', type=int, default=10, help='thumbnails per contact sheet row')
+    ap.add_argument('--rows', type=int, default=10, help='thumbnail rows per contact sheet')
+    ap.add_argument('-w', '--workers', type=int, help='rendering processes (default: one per CPU)')
+    args = vars(ap.parse_args())
+
+    counts = run_gallery(args['outputDir'], args['nConfigs'], args['startSeed'], args['nCircles'],
+                         args['randomPos'], args['thumbSize'], args['cols'], args['rows'], args['workers'])
+    print(', '.join('{} {}'.format(n, status) for status, n in sorted(counts.items())))
@@ -0,0 +1,175 @@
+"""Headless, memory-bounded spirograph rendering at arbitrary resolution
+
+The curve is rasterized one horizontal band at a time: each band only draws the path
+segments that cross it (anti-aliased, with sub-pixel precision) and is then streamed to the
+output, so peak memory is one band rather than the whole image. PNGs are encoded
+incrementally; other formats are assembled in a memory-mapped file before writing.
+"""
+import os
+import math
+import struct
+import tempfile
+import zlib
+import cv2
+import numpy as np
+from .trajectory import spiro_period, spirograph_path
+
+# bits of sub-pixel precision passed to cv2.polylines
+SUBPIXEL_BITS = 4
+# curve samples evaluated at once when building a poster path
+CHUNK_STEPS = 1 << 18
+
+
+class StreamingPngWriter:
+    """Write an RGB PNG row band by row band without holding the whole image in memory
+
+    :param path: output path
+    :param width: image width
+    :param height: image height
+    :param level: zlib compression level
+    """
+    def __init__(self, path, width, height, level=6):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(level)
+        self.file = open(path, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bit depth, color type 2 (RGB), default compression/filter, no interlacing
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def write(self, band):
+        """Append a (rows, width, 3) BGR uint8 band below the rows written so far"""
+        rows = np.empty((band.shape[0], 1 + 3 * self.width), dtype='uint8')
+        rows[:, 0] = 0  # filter type: none
+        rows[:, 1:] = cv2.cvtColor(band, cv2.COLOR_BGR2RGB).reshape(band.shape[0], -1)
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows_written += band.shape[0]
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.file.close()
+            raise ValueError('wrote {} of {} rows'.format(self.rows_written, self.height))
+        self._chunk(b'IDAT', self.compressor.flush())
+        self._chunk(b'IEND', b'')
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def fit_path(path, size, margin=0.02):
+    """Scale and center a path so its bounding box fits a size x size image
+
+    :return: (fitted path, scale factor applied)
+    """
+    lo = path.min(axis=0)
+    extent = max(float((path.max(axis=0) - lo).max()), 1e-9)
+    scale = size * (1 - 2 * margin) / extent
+    offset = (size - (path.max(axis=0) - lo) * scale) / 2
+    return (path - lo) * scale + offset, scale
+
+
+def _sampled_path(radii, speeds, pos, period, n_steps, chunk_steps):
+    # pen positions at n_steps + 1 evenly spaced times over one period, evaluated chunk_steps at a
+    # time so the per-circle temporaries stay bounded however long the period is
+    path = np.empty((n_steps + 1, 2))
+    for lo in range(0, n_steps + 1, chunk_steps):
+        hi = min(lo + chunk_steps, n_steps + 1)
+        t = np.arange(lo, hi) * (period / n_steps)
+        path[lo:hi] = spirograph_path(radii, speeds, pos, t=t)
+    return path
+
+
+def poster_path(radii, speeds, pos=(), size=20000, max_segment=4, margin=0.02, chunk_steps=CHUNK_STEPS):
+    """Pen path over one full period scaled to a size x size poster, sampled finely enough that no
+    segment is much longer than max_segment pixels
+
+    Unlike spiro_times, the number of samples isn't capped: a large poster of a long-period curve
+    gets every sample it needs, generated chunk_steps at a time.
+    """
+    period = spiro_period(speeds)
+    coarse = _sampled_path(radii, speeds, pos, period, max(1, math.ceil(period)), chunk_steps)
+    coarse, scale = fit_path(coarse, size, margin)
+    longest = float(np.hypot(*np.diff(coarse, axis=0).T).max(initial=0))
+    del coarse
+
+    steps_per_unit = max(1, math.ceil(longest / max_segment))
+    n_steps = max(1, math.ceil(period * steps_per_unit))
+    path, _ = fit_path(_sampled_path(radii, speeds, pos, period, n_steps, chunk_steps), size, margin)
+    return path
+
+
+def _draw_band(band, y0, fixed_path, seg_lo, seg_hi, color, thickness):
+    # segments crossing the band (plus the line's half width), drawn as runs of consecutive points
+    pad = (thickness + 2) << SUBPIXEL_BITS
+    top = y0 << SUBPIXEL_BITS
+    bottom = (y0 + band.shape[0]) << SUBPIXEL_BITS
+    crossing = np.flatnonzero((seg_hi >= top - pad) & (seg_lo <= bottom + pad))
+    if not len(crossing):
+        return
+
+    breaks = np.flatnonzero(np.diff(crossing) > 1) + 1
+    shifted = fixed_path - np.array([0, top], dtype='int32')
+    runs = [shifted[run[0]:run[-1] + 2] for run in np.split(crossing, breaks)]
+    cv2.polylines(band, runs, False, color, thickness, cv2.LINE_AA, SUBPIXEL_BITS)
+
+
+def render_poster(radii, speeds, output, pos=(), size=20000, draw_color=(200, 125, 150), background=50,
+                  thickness=None, band_height=256):
+    """Render a size x size anti-aliased spirograph image to output without a window
+
+    :param output: image path; .png is streamed band by band, any other format cv2 can write is
+                   assembled in a temporary memory-mapped file next to it first
+    :param size: width and height of the image in pixels
+    :param thickness: line thickness in pixels (scaled with size if None)
+    :param band_height: rows rasterized at a time; peak memory is a few band_height * size * 3 byte buffers
+    """
+    if thickness is None:
+        thickness = max(1, round(size / 2000))
+    path = poster_path(radii, speeds, pos, size)
+    fixed_path = np.round(path * (1 << SUBPIXEL_BITS)).astype('int32')
+    seg_lo = np.minimum(fixed_path[:-1, 1], fixed_path[1:, 1])
+    seg_hi = np.maximum(fixed_path[:-1, 1], fixed_path[1:, 1])
+
+    if os.path.splitext(output)[1].lower() == '.png':
+        writer = StreamingPngWriter(output, size, size)
+        canvas = None
+    else:
+        writer = None
+        scratch = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(output)), suffix='.raw')
+        canvas = np.memmap(scratch, dtype='uint8', mode='w+', shape=(size, size, 3))
+
+    try:
+        # bands are drawn with overlap rows above and below so lines aren't clipped at their edges
+        overlap = thickness + 2
+        band = np.empty((band_height + 2 * overlap, size, 3), dtype='uint8')
+        for y0 in range(0, size, band_height):
+            n_rows = min(band_height, size - y0)
+            band.fill(background)
+            _draw_band(band, y0 - overlap, fixed_path, seg_lo, seg_hi, draw_color, thickness)
+            rows = band[overlap:overlap + n_rows]
+            if writer is not None:
+                writer.write(rows)
+            else:
+                canvas[y0:y0 + n_rows] = rows
+
+        if writer is not None:
+            writer.close()
+        elif not cv2.imwrite(output, canvas):
+            raise IOError('could not write {}'.format(output))
+    finally:
+        if canvas is not None:
+            del canvas
+            scratch.close()
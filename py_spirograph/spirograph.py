@@ -1,35 +1,70 @@
-import random
+"""Random spirograph drawing (`misc-sims spiro` or `python -m py_spirograph.spirograph`)
+
+Only argparse is imported at module level; OpenCV, NumPy and the drawing modules are
+imported by main() once the arguments have been parsed.
+"""
 import argparse
-import cv2
-from utils import draw_spirograph, str_2_bool
-
-ap = argparse.ArgumentParser()
-ap.add_argument('-o', '--output', type=str, default='spirograph_drawing.png',
-                help='path to save output image to')
-ap.add_argument('-n', '--nCircles', type=int, default=3,
-                help='number of circles in spirograph')
-ap.add_argument('-p', '--randomPos', type=str_2_bool, default='f',
-                help='randomize whether circles are draw inside or outside of parent?')
-args = vars(ap.parse_args())
-
-
-# create random descending radii
-radii = sorted([random.randrange(1, 101, 1) for _ in range(args['nCircles'])], key=lambda x: -x)
-
-# create random ascending speeds
-speeds = sorted([random.randrange(10, 101, 1) / 200 for _ in radii[1:]])
-# force speeds to alternate direction
-speeds = [s * (-1) ** i for i, s in enumerate(speeds)]
-
-# create positioning list
-if args['randomPos']:
-    pos = [random.choice(['in', 'out']) for _ in radii[1:]]
-else:
-    pos = []
-
-# derive canvas from max possible radii combination
-max_dist = int(2 * (sum(r * 2 for r in radii[1:]) + radii[0])) + 1
-drawing = draw_spirograph(radii, speeds, pos, canvas_size=(max_dist, max_dist))
-
-# save output
-cv2.imwrite('spirograph_drawing.png', drawing)
+
+
+def str_2_bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
+
+def add_arguments(ap):
+    ap.add_argument('-o', '--output', type=str, default='spirograph_drawing.png',
+                    help='path to save output image to')
+    ap.add_argument('-n', '--nCircles', type=int, default=3,
+                    help='number of circles in spirograph')
+    ap.add_argument('-p', '--randomPos', type=str_2_bool, default='f',
+                    help='randomize whether circles are draw inside or outside of parent?')
+    ap.add_argument('--seed', type=int,
+                    help='seed for a reproducible configuration (e.g. one from a gallery manifest)')
+    ap.add_argument('--headless', action='store_true',
+                    help='render the finished drawing without opening an animation window')
+    ap.add_argument('-s', '--size', type=int,
+                    help='(headless) width and height of the output in pixels; large sizes (e.g. 20000) '
+                         'are rendered anti-aliased in bands to keep memory bounded')
+    ap.add_argument('-a', '--animate', type=str,
+                    help='(headless) also export the animation with its circles to this .gif or video '
+                         '(.mp4, .avi) path')
+    ap.add_argument('--fps', type=int, default=30, help='(animate) frames per second')
+    ap.add_argument('--every', type=int, default=1, help='(animate) curve steps per frame')
+    ap.add_argument('--maxFrames', type=int,
+                    help='(animate) skip steps as needed so the animation has at most this many frames')
+    return ap
+
+
+def main(args):
+    import cv2
+    from .animation import export_animation
+    from .poster import render_poster
+    from .utils import draw_spirograph, random_config, render_spirograph
+
+    config = random_config(args['seed'], args['nCircles'], args['randomPos'])
+    radii, speeds, pos = config['radii'], config['speeds'], config['pos']
+
+    if args['size']:
+        render_poster(radii, speeds, args['output'], pos, size=args['size'])
+        return
+
+    # derive canvas from max possible radii combination
+    max_dist = int(2 * (sum(r * 2 for r in radii[1:]) + radii[0])) + 1
+    if args['animate']:
+        drawing = export_animation(radii, speeds, args['animate'], pos, canvas_size=(max_dist, max_dist),
+                                   fps=args['fps'], every=args['every'], max_frames=args['maxFrames'])
+    elif args['headless']:
+        drawing = render_spirograph(radii, speeds, pos, canvas_size=(max_dist, max_dist))
+    else:
+        drawing = draw_spirograph(radii, speeds, pos, canvas_size=(max_dist, max_dist))
+
+    # save output
+    cv2.imwrite(args['output'], drawing)
+
+
+if __name__ == '__main__':
+    main(vars(add_arguments(argparse.ArgumentParser()).parse_args()))
@@ -0,0 +1,87 @@
+"""Closed-form spirograph trajectories
+
+Circle i (i >= 1) rides on the border of circle i - 1, its center at distance
+parent_radius + radius ('out') or parent_radius - radius ('in') from the parent's center,
+at angle speeds[i - 1] * t after t steps. Every center (and the pen, the center of the last
+circle) is therefore a sum of rotating vectors, evaluated for all t in one NumPy expression.
+"""
+import math
+from fractions import Fraction
+import numpy as np
+
+MAX_DENOMINATOR = 10000
+MAX_STEPS = 1000000
+
+
+def arm_lengths(radii, pos=()):
+    """Distance from each circle's center to its parent's center (negative when an 'in' circle is
+    larger than its parent)"""
+    if not pos:
+        pos = ['out' for _ in radii[1:]]
+    return np.array([parent_r + (-r if p == 'in' else r) for parent_r, r, p in zip(radii, radii[1:], pos)],
+                    dtype='float64')
+
+
+def spiro_period(speeds, max_denominator=MAX_DENOMINATOR):
+    """Number of steps until the curve closes: 2 pi over the greatest common divisor of the speeds
+
+    Speeds are treated as fractions (limited to max_denominator), so e.g. speeds of 0.185 and
+    -0.3 rad/step (37/200 and -3/10) share a divisor of 1/200 and close after 400 pi steps.
+    """
+    fractions = [abs(Fraction(s).limit_denominator(max_denominator)) for s in speeds]
+    fractions = [f for f in fractions if f]
+    if not fractions:
+        return 0.0
+    numerator = denominator = None
+    for f in fractions:
+        if numerator is None:
+            numerator, denominator = f.numerator, f.denominator
+        else:
+            numerator = math.gcd(numerator, f.numerator)
+            denominator = denominator * f.denominator // math.gcd(denominator, f.denominator)
+    return 2 * math.pi * denominator / numerator
+
+
+def spiro_times(speeds, steps_per_unit=1, max_steps=MAX_STEPS):
+    """Sample times covering exactly one period (at most max_steps + 1 samples)
+
+    :param steps_per_unit: samples per original animation step; raise it for smoother large renders
+    """
+    period = spiro_period(speeds)
+    n_steps = min(max(1, math.ceil(period * steps_per_unit)), max_steps)
+    if period * steps_per_unit > max_steps:
+        # the curve doesn't close within max_steps: sample the first max_steps steps
+        return np.arange(n_steps + 1) / steps_per_unit
+    return np.linspace(0, period, n_steps + 1)
+
+
+def circle_centers(radii, speeds, pos=(), t=None, center=(0, 0)):
+    """Centers of every circle at each time in t (one full period if None)
+
+    :return: (T, len(radii), 2) float64 array of x, y
+    """
+    if t is None:
+        t = spiro_times(speeds)
+    t = np.asarray(t, dtype='float64')
+    angles = t[:, np.newaxis] * np.asarray(speeds, dtype='float64')
+    arms = arm_lengths(radii, pos)
+
+    centers = np.empty((len(t), len(radii), 2))
+    centers[:, 0] = center
+    centers[:, 1:, 0] = arms * np.cos(angles)
+    centers[:, 1:, 1] = arms * np.sin(angles)
+    return np.cumsum(centers, axis=1)
+
+
+def spirograph_path(radii, speeds, pos=(), t=None, center=(0, 0)):
+    """Pen positions (center of the last circle) at each time in t (one full period if None)
+
+    :return: (T, 2) float64 array of x, y
+    """
+    if t is None:
+        t = spiro_times(speeds)
+    t = np.asarray(t, dtype='float64')
+    arms = arm_lengths(radii, pos)
+    pen = np.exp(1j * t[:, np.newaxis] * np.asarray(speeds, dtype='float64')) @ arms.astype('complex128')
+    pen += complex(*center)
+    return np.stack([pen.real, pen.imag], axis=1)
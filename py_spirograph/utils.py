@@ -1,16 +1,34 @@
 import math
-import argparse
+import random
 import cv2
 import numpy as np
+from .animation import SpiroAnimator
+from .trajectory import spirograph_path
 
 
-def str_2_bool(v):
-    if v.lower() in ('yes', 'true', 't', 'y', '1'):
-        return True
-    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
-        return False
+def random_config(seed=None, n_circles=3, random_pos=False):
+    """Random spirograph parameters: descending radii, ascending speeds alternating in direction
+
+    :param seed: seed for a reproducible configuration (random if None)
+    :return: dict of radii, speeds and pos for draw_spirograph/render_spirograph
+    """
+    rng = random.Random(seed)
+
+    # create random descending radii
+    radii = sorted([rng.randrange(1, 101, 1) for _ in range(n_circles)], key=lambda x: -x)
+
+    # create random ascending speeds
+    speeds = sorted([rng.randrange(10, 101, 1) / 200 for _ in radii[1:]])
+    # force speeds to alternate direction
+    speeds = [s * (-1) ** i for i, s in enumerate(speeds)]
+
+    # create positioning list
+    if random_pos:
+        pos = [rng.choice(['in', 'out']) for _ in radii[1:]]
     else:
-        raise argparse.ArgumentTypeError('Boolean value expected.')
+        pos = []
+
+    return {'radii': radii, 'speeds': speeds, 'pos': pos}
 
 
 def gen_border_circle(parent_x, parent_y, parent_radius, r, angle, pos='out'):
@@ -24,13 +42,35 @@ def gen_border_circle(parent_x, parent_y, parent_radius, r, angle, pos='out'):
     return x2, y2
 
 
+def render_spirograph(radii, speeds, pos=(),
+                      canvas_size=(600, 600),
+                      draw_color=(200, 125, 150),
+                      t=None):
+    """Render the full spirograph curve at once
+
+    The whole pen path is computed in closed form and drawn with a single cv2.polylines call.
+
+    :param radii, speeds, pos: see draw_spirograph
+    :param canvas_size: the size of the canvas to draw on; the first circle is centered on it
+    :param draw_color: which color should be used to draw the spirograph output
+    :param t: times to sample the curve at (one full period, a sample per step, if None)
+    :return: the spirograph image
+    """
+    canvas = np.zeros(canvas_size + (3,), dtype='uint8') + 50
+    center = (canvas_size[1] // 2, canvas_size[0] // 2)
+    path = np.round(spirograph_path(radii, speeds, pos, t=t, center=center)).astype('int32')
+    cv2.polylines(canvas, [path], False, draw_color, 1)
+    return canvas
+
+
 def draw_spirograph(radii, speeds, pos=[],
                     canvas_size=(600, 600),
                     draw_color=(200, 125, 150),
                     circle_color=(150, 100, 200)):
     """Draw a spirograph animation
 
-    The spirograph will be made up of bordering circles rotating at given angular speeds
+    The spirograph will be made up of bordering circles rotating at given angular speeds.
+    The animation stops when the curve closes (or on ESC/Q).
 
     :param radii: a list of radii of to specify the size of each circle
     :param speeds: a list of angular velocities to be applied to each circle.
@@ -46,43 +86,12 @@ def draw_spirograph(radii, speeds, pos=[],
     :param circle_color: which color should the circles be in the animation
     :return: the resulting spirograph image without the circles in the animation
     """
-    canvas = np.zeros(canvas_size + (3,), dtype='uint8') + 50
-    cx = canvas_size[1] // 2
-    cy = canvas_size[0] // 2
-    parent_x = parent_y = parent_radius = 0  # initialized to please pycharm code checker
-
-    angles = [0 for _ in radii]
-    if not pos:
-        pos = ['out' for _ in radii]
-
-    prev_x = prev_y = None
-    while True:
-        canvas_i = canvas.copy()
-        for i, radius in enumerate(radii):
-            if i == 0:
-                x = cx
-                y = cy
-            else:
-                x, y = gen_border_circle(parent_x, parent_y, parent_radius, radius, angle=angles[i], pos=pos[i - 1])
-                angles[i] += speeds[i - 1]
-
-            cv2.circle(canvas_i, (x, y), radius, circle_color, thickness=1)
-
-            if i == len(radii) - 1:
-                canvas[y, x] = draw_color
-                if prev_x is not None and prev_y is not None:
-                    cv2.line(canvas, (prev_x, prev_y), (x, y), draw_color, 1)
-                prev_x = x
-                prev_y = y
-
-            parent_radius = radius
-            parent_x = x
-            parent_y = y
-
-        cv2.imshow('Spirograph Progress (press ESC or Q to quit)', canvas_i)
+    animator = SpiroAnimator(radii, speeds, pos, canvas_size, draw_color, circle_color)
+    for frame in animator:
+        cv2.imshow('Spirograph Progress (press ESC or Q to quit)', frame)
         key = cv2.waitKey(10)
 
         if key == ord('q') or key == 27:
             break
 
-    return canvas
+    return animator.canvas
@@ -0,0 +1 @@
+"""Particles steering towards the contours of an image"""
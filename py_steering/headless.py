@@ -0,0 +1,132 @@
+import time
+import numpy as np
+from misc_sims.instrument import NULL_INSTRUMENT
+from misc_sims.frame_writers import open_frame_writer
+from .morph import MorphController
+from .scene_class import SteerScene
+from .renderers import get_renderer
+from .utils import steer_particles
+
+
+def load_cursor_path(path):
+    """Read a scripted cursor trajectory from a csv file
+
+    Rows are either 'x,y' (one row per frame) or 't,x,y' (t in seconds, sampled by the runner).
+    Several simultaneous cursors are given as extra pairs: 'x1,y1,x2,y2' or 't,x1,y1,x2,y2'.
+    Empty or nan x, y values mean that cursor is off the canvas for that row.
+    Lines starting with '#' are ignored.
+
+    :return: an (n, 2k) or (n, 2k + 1) float array
+    """
+    return np.genfromtxt(path, delimiter=',', comments='#', dtype='float64', ndmin=2)
+
+
+def cursor_positions(cursor, dt):
+    """Generate the cursor position(s) for each simulation step
+
+    :param cursor: None, a csv path (see load_cursor_path), an array of rows in the same layout,
+                   or an iterable/generator yielding None, (x, y) or a list of (x, y) per step
+    :param dt: seconds per step; used to sample timestamped ('t,x,y') trajectories
+    """
+    if cursor is None:
+        cursor = ()
+
+    if isinstance(cursor, str):
+        cursor = load_cursor_path(cursor)
+
+    if isinstance(cursor, np.ndarray):
+        if cursor.shape[1] % 2:
+            yield from _sample_timed_cursor(cursor, dt)
+            return
+        cursor = (xy.reshape(-1, 2) for xy in cursor)
+
+    for xy in cursor:
+        yield xy
+
+    while True:
+        yield None
+
+
+def _sample_timed_cursor(rows, dt):
+    # 't,x,y' rows sampled every dt seconds, without end (past the last row the cursor stays put)
+    t, xy = rows[:, 0], rows[:, 1:]
+    step_i = 0
+    while True:
+        step_t = step_i * dt
+        yield np.array([np.interp(step_t, t, col) for col in xy.T]).reshape(-1, 2)
+        step_i += 1
+
+
+def run_headless(image, cursor=None, n_frames=300, fps=30, output=None, thresh_args=(), keys=None, seed=None,
+                 renderer='cv2', playlist=None, morph_every=None, instrument=NULL_INSTRUMENT, budget=None,
+                 target_fps=None):
+    """Run steer_image's simulation without any GUI calls
+
+    The simulation advances one fixed step of 1 / fps seconds per frame.
+
+    :param image: the image to steer particles towards
+    :param cursor: scripted cursor input; see cursor_positions
+    :param n_frames: number of steps to simulate
+    :param fps: steps per simulated second
+    :param output: optional path frames are streamed to (.gif, a video file, or a PNG pattern/directory)
+    :param thresh_args: custom thresholding params for contour detection
+    :param keys: optional dict of {frame index: key} to replay key presses (e.g. {0: 'g'})
+    :param seed: seed for numpy's RNG so runs are repeatable
+    :param renderer: 'cv2' or 'sprite'; see renderers.RENDERERS
+    :param playlist: optional morph.Playlist to morph through ('n' in keys or morph_every switch images)
+    :param morph_every: switch to the next playlist image every this many frames
+    :param instrument: a misc_sims.instrument.Instrument to time each frame's phases into
+    :param budget, target_fps: particle budget and adaptive level of detail (by wall time per
+                               frame); see utils.steer_particles
+    :return: a dict of run stats
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    keys = {int(i): (ord(k) if isinstance(k, str) else k) for i, k in (keys or {}).items()}
+
+    canvas = np.zeros(image.shape, dtype='uint8') + 50
+    particles, lod = steer_particles(image, canvas, thresh_args, budget, target_fps)
+    scene = SteerScene(canvas, particles, renderer=get_renderer(renderer))
+    morpher = MorphController(playlist, morph_every) if playlist is not None else None
+
+    frame = np.empty_like(canvas)
+    writer = None
+    if output:
+        writer = open_frame_writer(output, fps, frame_size=(canvas.shape[1], canvas.shape[0]))
+
+    positions = cursor_positions(cursor, 1 / fps)
+    start = time.perf_counter()
+    frame_i = 0
+    try:
+        for frame_i in range(n_frames):
+            key = keys.get(frame_i, -1)
+            if not scene.handle_key(key):
+                break
+            if morpher is not None:
+                with instrument.span('morph'):
+                    morpher.update(scene, key)
+            with instrument.span('step'):
+                scene.step(next(positions))
+            instrument.count('particles', len(scene.particles))
+
+            if writer is not None:
+                with instrument.span('render'):
+                    scene.render(frame)
+                instrument.draw_overlay(frame)
+                with instrument.span('write'):
+                    writer.write(frame)
+            if lod is not None:
+                with instrument.span('lod'):
+                    lod.update(scene)
+            instrument.tick()
+        else:
+            frame_i = n_frames
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - start
+
+    return {'frames': frame_i,
+            'particles': len(scene.particles),
+            'seconds': elapsed,
+            'fps': frame_i / elapsed if elapsed else float('inf')}
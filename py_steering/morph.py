@@ -0,0 +1,260 @@
+import os
+import threading
+import cv2
+import imutils
+import numpy as np
+from .preprocess import DEFAULT_CACHE_DIR, contour_targets
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    from scipy.spatial import cKDTree
+except ImportError:
+    linear_sum_assignment = cKDTree = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff')
+# nearest sources considered per destination when hungarian assignment has far more sources
+MAX_SOURCES_PER_TARGET = 4
+
+
+def expand_image_paths(paths):
+    """Expand directories in paths to the (sorted) image files they contain"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded += sorted(os.path.join(path, f) for f in os.listdir(path)
+                               if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def hilbert_index(xy):
+    """Position of each (non-negative, integer) x, y point along a Hilbert curve"""
+    x = np.clip(np.asarray(xy[:, 0], dtype='int64'), 0, None)
+    y = np.clip(np.asarray(xy[:, 1], dtype='int64'), 0, None)
+    n = 1 << max(1, int(max(x.max(initial=0), y.max(initial=0))).bit_length())
+
+    d = np.zeros(len(x), dtype='int64')
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+
+        # rotate the quadrant so the curve stays continuous at the next level
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return d
+
+
+def _curve_ranks(sources, destinations):
+    # sources and destinations in Hilbert order; destination rank j is paired with source rank j * n / m
+    src_order = np.argsort(hilbert_index(sources), kind='stable')
+    dst_order = np.argsort(hilbert_index(destinations), kind='stable')
+    src_rank_for_dst = np.arange(len(destinations)) * len(sources) // len(destinations)
+    return src_order, dst_order, src_rank_for_dst
+
+
+def _exact_assignment(sources, destinations):
+    # min total squared distance; sources are repeated when there are more destinations than sources
+    repeats = -(-len(destinations) // len(sources))
+    candidates = np.tile(np.arange(len(sources)), repeats)
+    xy_diff = destinations[:, np.newaxis, :] - sources[candidates][np.newaxis, :, :]
+    cost = np.einsum('ijk,ijk->ij', xy_diff, xy_diff)
+    dst_i, cand_i = linear_sum_assignment(cost)
+    src_for_dst = np.empty(len(destinations), dtype='int64')
+    src_for_dst[dst_i] = candidates[cand_i]
+    return src_for_dst
+
+
+def assign_targets(sources, destinations, method='curve', block_size=1000):
+    """Match source particles to destination targets so flight paths stay short
+
+    'curve' orders both point sets along a Hilbert curve and pairs them by rank, which is
+    O(n log n) and keeps neighbours together. 'hungarian' starts from the same pairing and
+    then solves an exact assignment (scipy's linear_sum_assignment) within each block of
+    block_size consecutive destinations, so small sets are matched optimally and large ones
+    are refined locally. 'hungarian' falls back to 'curve' when scipy isn't installed.
+
+    :param sources: (n, 2) current particle targets/locations
+    :param destinations: (m, 2) targets of the next image
+    :param block_size: destinations per exact assignment (when sources far outnumber them, only
+                       the MAX_SOURCES_PER_TARGET nearest sources of each are candidates)
+    :return: (m,) index of the source particle that flies to each destination
+    """
+    sources = np.asarray(sources, dtype='float64')
+    destinations = np.asarray(destinations, dtype='float64')
+    if not len(sources) or not len(destinations):
+        return np.zeros(len(destinations), dtype='int64')
+
+    src_order, dst_order, src_rank_for_dst = _curve_ranks(sources, destinations)
+    src_for_dst = np.empty(len(destinations), dtype='int64')
+    src_for_dst[dst_order] = src_order[src_rank_for_dst]
+
+    if method == 'curve' or linear_sum_assignment is None:
+        return src_for_dst
+    elif method != 'hungarian':
+        raise ValueError('unknown assignment method {!r}'.format(method))
+
+    for start in range(0, len(destinations), block_size):
+        stop = min(start + block_size, len(destinations))
+        block_dst = dst_order[start:stop]
+        src_start = src_rank_for_dst[start]
+        src_stop = src_rank_for_dst[stop] if stop < len(destinations) else len(sources)
+        block_src = src_order[src_start:max(src_stop, src_start + 1)]
+        if len(block_src) > MAX_SOURCES_PER_TARGET * len(block_dst):
+            # far more sources than destinations: only the sources nearest each destination are
+            # candidates, so the cost matrix stays bounded by block_size
+            _, near = cKDTree(sources[block_src]).query(destinations[block_dst], k=MAX_SOURCES_PER_TARGET)
+            block_src = block_src[np.unique(near)]
+
+        matched = _exact_assignment(sources[block_src], destinations[block_dst])
+        src_for_dst[block_dst] = block_src[matched]
+
+    return src_for_dst
+
+
+def fit_image(image, canvas_shape):
+    """Scale an image to fit within canvas_shape and center it on a black background"""
+    h, w = image.shape[:2]
+    scale = min(canvas_shape[0] / h, canvas_shape[1] / w)
+    if scale != 1:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        h, w = image.shape[:2]
+
+    fitted = np.zeros(tuple(canvas_shape[:2]) + (3,), dtype='uint8')
+    y0 = (canvas_shape[0] - h) // 2
+    x0 = (canvas_shape[1] - w) // 2
+    fitted[y0:y0 + h, x0:x0 + w] = image
+    return fitted
+
+
+class Playlist:
+    """A sequence of images to morph particles through, preprocessed in a background thread
+
+    The first image sets the canvas size; every later image is scaled to fit and centered.
+    The worker thread loads and traces every image and then precomputes the particle
+    assignment for each transition, so switching images never waits on that work.
+
+    :param paths: image paths (directories are expanded to the images they contain)
+    :param resize_width: pixel width to resize the first image to
+    :param thresh_args: custom params for thresholding before contour detection
+    :param every_n: keep every nth contour point as a particle target
+    :param method: assignment method passed to assign_targets
+    """
+    def __init__(self, paths, resize_width=900, thresh_args=(), every_n=20, method='hungarian',
+                 cache_dir=DEFAULT_CACHE_DIR):
+        self.paths = expand_image_paths(paths)
+        if not self.paths:
+            raise ValueError('playlist has no images')
+        self.thresh_args = thresh_args
+        self.every_n = every_n
+        self.method = method
+        self.cache_dir = cache_dir
+
+        self.first_image = imutils.resize(cv2.imread(self.paths[0]), width=resize_width)
+        self.canvas_shape = self.first_image.shape
+
+        self.targets = {}
+        self.transitions = {}
+        self.ready = threading.Condition()
+        self.error = None
+        self.stopping = threading.Event()
+
+        self.worker = threading.Thread(target=self._precompute, daemon=True)
+        self.worker.start()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _trace(self, i):
+        image = self.first_image if i == 0 else fit_image(cv2.imread(self.paths[i]), self.canvas_shape)
+        return contour_targets(image, self.every_n, self.thresh_args, cache_dir=self.cache_dir)
+
+    def _precompute(self):
+        try:
+            for i in range(len(self)):
+                if self.stopping.is_set():
+                    return
+                traced = self._trace(i)
+                with self.ready:
+                    self.targets[i] = traced
+                    self.ready.notify_all()
+
+            for i in range(len(self)):
+                if self.stopping.is_set():
+                    return
+                j = (i + 1) % len(self)
+                src_for_dst = assign_targets(self.targets[i][0], self.targets[j][0], self.method)
+                with self.ready:
+                    self.transitions[i] = src_for_dst
+                    self.ready.notify_all()
+        except Exception as e:
+            with self.ready:
+                self.error = e
+                self.ready.notify_all()
+
+    def close(self):
+        """Stop precomputing and wait for the worker to finish its current step"""
+        self.stopping.set()
+        self.worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, table, i, wait):
+        with self.ready:
+            if wait:
+                self.ready.wait_for(lambda: i in table or self.error is not None)
+            if self.error is not None:
+                raise self.error
+            return table.get(i)
+
+    def image_targets(self, i, wait=True):
+        """(targets, colors) for image i; None if not traced yet and wait is False"""
+        return self._get(self.targets, i, wait)
+
+    def transition(self, i, wait=False):
+        """Destination-to-source index map from image i to the next one; None if not ready yet"""
+        return self._get(self.transitions, i, wait)
+
+
+class MorphController:
+    """Switch a SteerScene between playlist images
+
+    Pressing 'n' (or every morph_every frames, if set) requests the next image. The switch
+    happens on the first frame the precomputed transition is available; until then the
+    current image keeps running, so the render loop never blocks.
+    """
+    def __init__(self, playlist, morph_every=None):
+        self.playlist = playlist
+        self.morph_every = morph_every
+        self.image_i = 0
+        self.frame_i = 0
+        self.pending = False
+
+    def update(self, scene, key=-1):
+        self.frame_i += 1
+        if key == ord('n') or (self.morph_every and self.frame_i % self.morph_every == 0):
+            self.pending = True
+
+        if not self.pending or len(self.playlist) < 2:
+            return False
+
+        src_for_dst = self.playlist.transition(self.image_i)
+        if src_for_dst is None:
+            return False
+
+        next_i = (self.image_i + 1) % len(self.playlist)
+        targets, colors = self.playlist.image_targets(next_i)
+        scene.particles = scene.particles.remap(src_for_dst, targets, colors)
+        self.image_i = next_i
+        self.pending = False
+        return True
@@ -1,21 +1,216 @@
 import numpy as np
 import cv2
+from .spatial_grid import SpatialHashGrid
+
+
+def random_locations(n, canvas):
+    xs = np.random.randint(1, canvas.shape[1], n)
+    ys = np.random.randint(1, canvas.shape[0], n)
+    return np.column_stack((xs, ys)).astype('float64')
+
+
+def cursor_array(mouse_loc):
+    """Normalize None, one (x, y) or a list of (x, y) cursors to a (k, 2) array of on-canvas cursors"""
+    if mouse_loc is None:
+        return np.zeros((0, 2), dtype='float64')
+
+    cursors = np.asarray(mouse_loc, dtype='float64').reshape(-1, 2)
+    return cursors[np.isfinite(cursors).all(axis=1)]
+
+
+class ParticleSystem:
+    """Struct-of-arrays store for a set of particles
+
+    Every per-particle attribute lives in one contiguous array so that arrive, flee,
+    game-mode retargeting and hit checks run as whole-array operations.
+    Indexing or iterating the system yields :class:`Particle` views into these arrays.
+
+    :param locations: (N, 2) array of starting x, y locations
+    :param targets: (N, 2) array of x, y targets the particles arrive at
+    :param radius: scalar or (N,) array of particle radii
+    :param colors: a single color or an (N, 3) array of BGR colors
+    :param max_speed: scalar or (N,) array of max speeds
+    """
+    def __init__(self, locations, targets, radius=4, colors=(255, 255, 255), max_speed=75):
+        self.location = np.array(locations, dtype='float64').reshape(-1, 2)
+        n = len(self.location)
+
+        self.target = np.array(targets, dtype='float64').reshape(n, 2)
+        self.speed = np.zeros((n, 2), dtype='float64')
+        self.acceleration = np.zeros((n, 2), dtype='float64')
+        self.max_speed = np.broadcast_to(np.asarray(max_speed, dtype='float64'), (n,)).copy()
+
+        self.radius = np.broadcast_to(np.asarray(radius, dtype='int32'), (n,)).copy()
+        self.og_color = np.broadcast_to(np.asarray(colors, dtype='uint8'), (n, 3)).copy()
+        self.color = self.og_color.copy()
+
+        self.game_target = self.target.copy()
+        self.is_hit = np.zeros(n, dtype='bool')
+        self.grid = None
+
+    def __len__(self):
+        return len(self.location)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('particle index out of range')
+        return Particle.view(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Particle.view(self, i)
+
+    @staticmethod
+    def _interp_speed(xy_diff, canvas, max_speed):
+        # same mapping as Particle.arrive_step's np.interp, scaled per particle
+        max_dim = max(canvas.shape)
+        unit_speed = np.interp(xy_diff, (-max_dim, max_dim + 1), (-1, 1))
+        return unit_speed * max_speed[:, np.newaxis]
+
+    def update(self, canvas, mouse_loc, target=None):
+        self.arrive_step(canvas, target=target)
+        self.flee_step(canvas, mouse_loc)
+        self.speed += self.acceleration
+        self.location += self.speed
+
+    def arrive_step(self, canvas, target=None):
+        if target is None:
+            target = self.target
+
+        self.speed = self._interp_speed(target - self.location, canvas, self.max_speed)
+
+    def index(self, canvas, cell_size=50):
+        """Spatial index over the current particle locations, incrementally updated"""
+        if self.grid is None:
+            self.grid = SpatialHashGrid(canvas.shape[1::-1], cell_size)
+        return self.grid.update(self.location)
+
+    def flee_step(self, canvas, mouse_loc, flee_range=50):
+        """Push particles away from every cursor within flee_range
+
+        :param mouse_loc: None, an (x, y) cursor, or a list of (x, y) cursors/repellers
+        """
+        cursors = cursor_array(mouse_loc)
+        if not len(cursors):
+            return
+
+        grid = self.index(canvas)
+        fleeing = []
+        flee_speeds = []
+        for cursor in cursors:
+            near = grid.query_radius(cursor, flee_range)
+            fleeing.append(near)
+            flee_speeds.append(-10 * self._interp_speed(cursor - self.location[near], canvas, self.max_speed[near]))
+
+        fleeing = np.concatenate(fleeing)
+        if not len(fleeing):
+            return
+
+        # particles near several repellers flee from all of them
+        unique_fleeing, inverse = np.unique(fleeing, return_inverse=True)
+        speed = np.zeros((len(unique_fleeing), 2), dtype='float64')
+        np.add.at(speed, inverse, np.concatenate(flee_speeds))
+        self.speed[unique_fleeing] = speed
+
+    def check_hit(self, mouse_loc, mouse_range=50, canvas=None):
+        """Mark particles within mouse_range of any cursor (or drawn in the dead color) as caught"""
+        cursors = cursor_array(mouse_loc)
+        hit = (self.color == 50).all(axis=1)
+        if len(cursors):
+            if canvas is None:
+                xy_diff = cursors[:, np.newaxis, :] - self.location
+                hit |= (np.einsum('kij,kij->ki', xy_diff, xy_diff) <= mouse_range ** 2).any(axis=0)
+            else:
+                hit[self.index(canvas).query_many(cursors, mouse_range)] = True
+
+        self.is_hit |= hit
+        self.game_target[hit] = self.target[hit]
+        self.color[hit] = self.og_color[hit]
+
+    def game_retarget(self, canvas, blink_flag, reach=30):
+        """Send uncaught particles that reached their game target somewhere new
+
+        :return: the number of particles that have been caught
+        """
+        xy_diff = self.location - self.game_target
+        arrived = ~self.is_hit & (np.einsum('ij,ij->i', xy_diff, xy_diff) <= reach ** 2)
+
+        n_arrived = np.count_nonzero(arrived)
+        if n_arrived:
+            self.color[arrived] = (30, 30, 200) if blink_flag else (100, 100, 150)
+            self.game_target[arrived] = random_locations(n_arrived, canvas)
+
+        return int(np.count_nonzero(self.is_hit))
+
+    def remap(self, src_for_dst, targets, colors):
+        """A new system with one particle per target, each starting where particle src_for_dst[i] is now
+
+        Game progress goes with the particles: ones remapped from a caught particle stay caught,
+        and uncaught ones keep their game target and (blinking) game color.
+        """
+        remapped = ParticleSystem(self.location[src_for_dst], targets, self.radius[src_for_dst], colors,
+                                  self.max_speed[src_for_dst])
+        remapped.speed[:] = self.speed[src_for_dst]
+
+        remapped.is_hit[:] = self.is_hit[src_for_dst]
+        uncaught = ~remapped.is_hit
+        remapped.game_target[uncaught] = self.game_target[src_for_dst[uncaught]]
+        in_game_color = uncaught & (self.color != self.og_color).any(axis=1)[src_for_dst]
+        remapped.color[in_game_color] = self.color[src_for_dst[in_game_color]]
+        return remapped
+
+    def reset_game(self):
+        self.color[:] = self.og_color
+        self.is_hit[:] = False
+
+    def randomize_locations(self, canvas):
+        self.location[:] = random_locations(len(self), canvas)
+
+    def show(self, canvas):
+        locations = self.location.astype('int').tolist()
+        for location, radius, color in zip(locations, self.radius.tolist(), self.color.tolist()):
+            cv2.circle(canvas, tuple(location), radius, color, -1)
+
+
+def _as_color(color):
+    return tuple(int(x) for x in color)
+
+
+def _view_property(name, cast=None):
+    # expose row i of a ParticleSystem array as a Particle attribute
+    def getter(self):
+        value = getattr(self._system, name)[self._i]
+        return value if cast is None else cast(value)
+
+    def setter(self, value):
+        getattr(self._system, name)[self._i] = value
+
+    return property(getter, setter)
 
 
 class Particle:
+    """A single particle; a thin view into one row of a :class:`ParticleSystem`"""
     def __init__(self, location, target, radius=4, color=(255, 255, 255), max_speed=75):
-        self.target = np.array(target)
-        self.location = np.array(location, dtype='float64')
-        self.speed = np.array([0, 0], dtype='float64')
-        self.acceleration = np.array([0, 0], dtype='float64')
-        self.max_speed = max_speed
+        self._system = ParticleSystem([location], [target], radius, color, max_speed)
+        self._i = 0
 
-        self.radius = radius
-        self.og_color = color
-        self.color = color
+    @classmethod
+    def view(cls, system, i):
+        particle = cls.__new__(cls)
+        particle._system = system
+        particle._i = i
+        return particle
 
-        self.game_target = np.array(target)
-        self.is_hit = False
+    location = _view_property('location')
+    target = _view_property('target')
+    speed = _view_property('speed')
+    acceleration = _view_property('acceleration')
+    game_target = _view_property('game_target')
+    color = _view_property('color', _as_color)
+    og_color = _view_property('og_color', _as_color)
+    radius = _view_property('radius', int)
+    max_speed = _view_property('max_speed', float)
+    is_hit = _view_property('is_hit', bool)
 
     def update(self, canvas, mouse_loc, target=None):
         self.arrive_step(canvas, target=target)
@@ -25,7 +220,7 @@ class Particle:
 
     def show(self, canvas):
         location = self.location.astype('int')
-        cv2.circle(canvas, tuple(location), self.radius, self.color, -1)
+        cv2.circle(canvas, tuple(location.tolist()), self.radius, self.color, -1)
 
     def arrive_step(self, canvas, target=None):
         if target is None:
@@ -40,7 +235,8 @@ class Particle:
             xy_diff = np.array(mouse_loc) - self.location
             dist = np.linalg.norm(xy_diff)
             if dist <= 50:
-                speed = np.interp(xy_diff, (-max(canvas.shape), max(canvas.shape) + 1), (-self.max_speed, self.max_speed))
+                speed = np.interp(xy_diff, (-max(canvas.shape), max(canvas.shape) + 1),
+                                  (-self.max_speed, self.max_speed))
                 self.speed = -10 * speed
 
     def check_hit(self, mouse_loc, mouse_range=50):
@@ -0,0 +1,201 @@
+import os
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'py_steering')
+DEAD_COLOR = (50, 50, 50)
+
+# below this many contours a process pool costs more to start than it saves
+PARALLEL_MIN_CONTOURS = 2000
+
+
+def down_sample_points(contour, every_n=20):
+    return contour[::every_n]
+
+
+def find_contours(image, thresh_args=()):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if not thresh_args:
+        thresh_args = (5, 255, 0)
+    _, threshed = cv2.threshold(gray, *thresh_args)
+
+    # findContours returns 3 values in OpenCV 3 and 2 in OpenCV 2/4
+    contours, hierarchy = cv2.findContours(threshed, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)[-2:]
+    if hierarchy is None:
+        return [], np.zeros((0, 4), dtype='int32')
+
+    return list(contours), hierarchy[0]
+
+
+def _contour_stats(contours, every_n):
+    # per contour: area, centroid (or None when degenerate) and down sampled points
+    stats = []
+    for contour in contours:
+        moments = cv2.moments(contour)
+        centroid = None
+        if moments['m00']:
+            centroid = (int(moments['m10'] / moments['m00']), int(moments['m01'] / moments['m00']))
+        stats.append((cv2.contourArea(contour), centroid, down_sample_points(contour, every_n)))
+    return stats
+
+
+def contour_stats(contours, every_n=20, workers=None):
+    """Compute _contour_stats for every contour, across a process pool for large contour counts"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(contours) < PARALLEL_MIN_CONTOURS:
+        return _contour_stats(contours, every_n)
+
+    chunk_size = -(-len(contours) // workers)
+    chunks = [contours[i:i + chunk_size] for i in range(0, len(contours), chunk_size)]
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(_contour_stats, chunks, [every_n] * len(chunks))
+        return [stat for chunk in results for stat in chunk]
+
+
+def region_mean_colors(contours, hierarchy, areas, image):
+    """Mean color of the non-black pixels inside each filled contour, from one labeled image
+
+    Every contour is filled into a single label image, largest first, so each pixel ends up
+    labeled by the innermost contour containing it. Per-label color sums then come from one
+    bincount pass over the image, and child sums are folded into their parents (using the
+    contour hierarchy) to get the totals over each contour's whole filled region.
+    """
+    n = len(contours)
+    labels = np.zeros(image.shape[:2], dtype='int32')
+    for i in np.argsort(areas)[::-1]:
+        cv2.drawContours(labels, contours, int(i), int(i) + 1, -1)
+
+    non_black = image.any(axis=2)
+    pixel_labels = labels[non_black]
+    pixel_colors = image[non_black].astype('float64')
+
+    counts = np.bincount(pixel_labels, minlength=n + 1)[1:].astype('float64')
+    sums = np.column_stack([np.bincount(pixel_labels, weights=pixel_colors[:, c], minlength=n + 1)[1:]
+                            for c in range(3)])
+
+    parents = hierarchy[:, 3]
+    depths = np.zeros(n, dtype='int64')
+    for i in range(n):
+        parent = parents[i]
+        while parent >= 0:
+            depths[i] += 1
+            parent = parents[parent]
+
+    for i in np.argsort(depths)[::-1]:
+        if parents[i] >= 0:
+            counts[parents[i]] += counts[i]
+            sums[parents[i]] += sums[i]
+
+    means = np.zeros((n, 3), dtype='uint8')
+    has_color = counts > 0
+    means[has_color] = (sums[has_color] / counts[has_color, np.newaxis]).astype('uint8')
+    return means
+
+
+def _traced_contours(image, every_n, thresh_args, workers):
+    # the (down sampled) points of every contour kept as particle targets, and one color per contour
+    contours, hierarchy = find_contours(image, thresh_args)
+    stats = contour_stats(contours, every_n, workers)
+    areas = np.array([area for area, _, _ in stats], dtype='float64')
+
+    colors = np.zeros((len(contours), 3), dtype='uint8')
+    needs_mean = np.zeros(len(contours), dtype='bool')
+    for i, (_, centroid, _) in enumerate(stats):
+        if centroid is None:
+            colors[i] = DEAD_COLOR
+            continue
+        cx = min(max(centroid[0], 0), image.shape[1] - 1)
+        cy = min(max(centroid[1], 0), image.shape[0] - 1)
+        colors[i] = image[cy, cx]
+        needs_mean[i] = not colors[i].any()
+
+    if needs_mean.any():
+        colors[needs_mean] = region_mean_colors(contours, hierarchy, areas, image)[needs_mean]
+
+    canvas_area = image.shape[0] * image.shape[1]
+    keep = [i for i in range(len(contours)) if areas[i] < .95 * canvas_area]
+
+    points = [stats[i][2].reshape(-1, 2).astype('int32') for i in keep]
+    return points, colors[keep]
+
+
+def _contour_targets(image, every_n, thresh_args, workers):
+    points, colors = _traced_contours(image, every_n, thresh_args, workers)
+    if not points:
+        return np.zeros((0, 2), dtype='int32'), np.zeros((0, 3), dtype='uint8')
+
+    targets = np.concatenate(points)
+    target_colors = np.repeat(colors, [len(p) for p in points], axis=0)
+    return targets, target_colors
+
+
+def cache_key(image, every_n, thresh_args):
+    key = hashlib.sha1(np.ascontiguousarray(image).tobytes())
+    key.update(repr((CACHE_VERSION, image.shape, image.shape[1], tuple(thresh_args), every_n)).encode())
+    return key.hexdigest()
+
+
+def _load_or_compute(cache_dir, key, compute):
+    # dict of arrays from cache_dir/key.npz, computed and written atomically on a miss
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, key + '.npz')
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                return dict(cached)
+
+    arrays = compute()
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, cache_path)
+
+    return arrays
+
+
+def contour_targets(image, every_n=20, thresh_args=(), cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """Particle targets and colors for an image, in one preprocessing pass
+
+    Results are cached on disk keyed by the image content, its (resized) width, the threshold
+    args and every_n, so repeat launches skip contour detection entirely.
+
+    :param image: BGR image (already resized) to trace
+    :param every_n: keep every nth point of each contour
+    :param thresh_args: custom params for thresholding before contour detection
+    :param cache_dir: directory for cached results; None disables the cache
+    :param workers: process count for per-contour work; None uses every core
+    :return: (N, 2) int32 x, y targets and (N, 3) uint8 BGR colors
+    """
+    def compute():
+        targets, colors = _contour_targets(image, every_n, thresh_args, workers)
+        return {'targets': targets, 'colors': colors}
+
+    cached = _load_or_compute(cache_dir, cache_key(image, every_n, thresh_args), compute)
+    return cached['targets'], cached['colors']
+
+
+def traced_contours(image, thresh_args=(), cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """Every point of every contour contour_targets would sample, with one color per contour
+
+    Cached on disk like contour_targets, so resampling to a new density (see resample.py)
+    never re-runs findContours.
+
+    :return: (N, 2) int32 x, y points of all contours concatenated, (k,) int64 points per
+             contour and (k, 3) uint8 BGR colors
+    """
+    def compute():
+        points, colors = _traced_contours(image, 1, thresh_args, workers)
+        return {'points': np.concatenate(points) if points else np.zeros((0, 2), dtype='int32'),
+                'lengths': np.array([len(p) for p in points], dtype='int64'),
+                'colors': colors}
+
+    cached = _load_or_compute(cache_dir, cache_key(image, 'contours', thresh_args), compute)
+    return cached['points'], cached['lengths'], cached['colors']
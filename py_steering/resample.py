@@ -0,0 +1,207 @@
+"""Particle targets spread along contours by arc length, for any particle budget
+
+contour_targets keeps every nth pixel of each contour, so a tiny contour may get a single
+particle and a long one thousands. A ContourSet instead divides a global budget between
+contours by perimeter (times an optional per-contour importance), with a minimum per contour,
+and places each contour's share evenly along its arc length. Every budget (level of detail)
+is resampled from the same cached full contours on first use, so switching density at
+runtime never re-runs findContours; AdaptiveLOD uses that to shed particles when the frame
+rate drops and add them back when it recovers.
+"""
+import time
+import numpy as np
+from .morph import assign_targets
+from .preprocess import DEFAULT_CACHE_DIR, traced_contours
+
+
+class ContourSet:
+    """The full traced contours of an image, resampled on demand
+
+    :param points: (N, 2) points of all contours concatenated (closed contours, in order)
+    :param lengths: (k,) number of points in each contour
+    :param colors: (k, 3) BGR color of each contour
+    :param importance: optional (k,) weight multiplying each contour's perimeter
+    :param min_points: particles every contour gets before the rest is split by weight
+                       (while the budget allows; lower weight contours miss out first)
+    """
+    def __init__(self, points, lengths, colors, importance=None, min_points=3):
+        self.points = np.asarray(points, dtype='float64').reshape(-1, 2)
+        self.lengths = np.asarray(lengths, dtype='int64')
+        self.colors = np.asarray(colors, dtype='uint8').reshape(-1, 3)
+        self.min_points = min_points
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype('int64')
+
+        # closing segment of each contour: from its last point back to its first
+        nxt = np.arange(len(self.points)) + 1
+        nxt[self.starts + self.lengths - 1] = self.starts
+        self.next_point = nxt
+        segment = np.hypot(*(self.points[nxt] - self.points).T)
+        self.arc_start = np.concatenate([[0], np.cumsum(segment)[:-1]])
+        self.segment = segment
+        self.perimeters = np.add.reduceat(segment, self.starts) if len(segment) else np.zeros(0)
+
+        if importance is None:
+            importance = np.ones(len(self.lengths))
+        self.weights = self.perimeters * np.asarray(importance, dtype='float64')
+        self._levels = {}
+
+    @classmethod
+    def from_image(cls, image, thresh_args=(), cache_dir=DEFAULT_CACHE_DIR, importance=None, min_points=3):
+        """Trace image (or load its traced contours from cache_dir) into a ContourSet"""
+        points, lengths, colors = traced_contours(image, thresh_args, cache_dir=cache_dir)
+        return cls(points, lengths, colors, importance, min_points)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def full_budget(self, every_n=20):
+        """The particle count contour_targets would give with every_n"""
+        return int(np.sum(-(-self.lengths // every_n)))
+
+    def allocate(self, budget):
+        """Particles per contour for a total budget
+
+        Contours get min_points each (in order of weight, while the budget lasts), the rest is
+        split in proportion to weight by largest remainder, and no contour gets more particles
+        than it has pixels.
+        """
+        n = len(self.lengths)
+        counts = np.zeros(n, dtype='int64')
+        budget = int(min(max(budget, 0), self.lengths.sum()))
+        if not n or not budget:
+            return counts
+
+        cap = self.lengths
+        order = np.argsort(-self.weights, kind='stable')
+        minimum = np.minimum(self.min_points, cap[order])
+        funded = np.cumsum(minimum) <= budget
+        counts[order[funded]] = minimum[funded]
+        remaining = budget - counts.sum()
+
+        # proportional split of what's left; contours at their cap drop out and the excess is re-split
+        while remaining > 0:
+            open_ = (counts < cap) & (self.weights > 0)
+            if not open_.any():
+                open_ = counts < cap
+                if not open_.any():
+                    break
+            weights = np.where(open_, np.maximum(self.weights, 1e-12), 0)
+            share = remaining * weights / weights.sum()
+            extra = np.minimum(np.floor(share).astype('int64'), cap - counts)
+            leftover = remaining - extra.sum()
+            if leftover > 0:
+                fraction = np.where(open_ & (counts + extra < cap), share - np.floor(share), -1)
+                top = np.argsort(-fraction, kind='stable')[:leftover]
+                extra[top[fraction[top] >= 0]] += 1
+            if not extra.any():
+                break
+            counts += extra
+            remaining = budget - counts.sum()
+        return counts
+
+    def resample(self, budget):
+        """(targets, colors) for budget particles spread evenly along each contour's arc length
+
+        :return: (n, 2) int32 x, y targets and (n, 3) uint8 BGR colors, n <= budget
+        """
+        counts = self.allocate(budget)
+        contour_i = np.repeat(np.arange(len(counts)), counts)
+        if not len(contour_i):
+            return np.zeros((0, 2), dtype='int32'), np.zeros((0, 3), dtype='uint8')
+
+        # the j-th of k samples on a contour sits (j + 0.5) / k of the way around it
+        first = np.cumsum(counts) - counts
+        j = np.arange(len(contour_i)) - first[contour_i]
+        offsets = (j + 0.5) / counts[contour_i] * self.perimeters[contour_i]
+        start = self.starts[contour_i]
+        arc = self.arc_start[start] + offsets
+
+        # segment each sample falls on, kept within its own contour
+        seg = np.searchsorted(self.arc_start, arc, side='right') - 1
+        seg = np.clip(seg, start, start + self.lengths[contour_i] - 1)
+        t = np.divide(arc - self.arc_start[seg], self.segment[seg],
+                      out=np.zeros(len(seg)), where=self.segment[seg] > 0)
+        p0 = self.points[seg]
+        p1 = self.points[self.next_point[seg]]
+        targets = np.round(p0 + np.clip(t, 0, 1)[:, np.newaxis] * (p1 - p0)).astype('int32')
+        return targets, self.colors[contour_i]
+
+    def lod_budgets(self, budget, n_levels=4, ratio=0.5):
+        """Budgets for n_levels levels of detail, from budget (at most every contour pixel) down by ratio
+        per level"""
+        budget = min(budget, len(self.points))
+        return [max(1, int(round(budget * ratio ** i))) for i in range(n_levels)]
+
+    def level(self, budget):
+        """resample(budget), computed on first use and cached"""
+        if budget not in self._levels:
+            self._levels[budget] = self.resample(budget)
+        return self._levels[budget]
+
+
+class AdaptiveLOD:
+    """Switch a SteerScene between levels of detail to hold a target frame rate
+
+    Call update(scene) once per frame. When the smoothed frame rate stays below target_fps for
+    patience frames, particles are remapped (each new target taking over the nearest particle
+    along a Hilbert curve) to the next lower budget; when it stays above headroom *
+    target_fps, to the next higher one.
+
+    :param contours: the ContourSet to resample
+    :param budgets: particle budgets, highest detail first
+    :param target_fps: frame rate to hold
+    :param level: index of the starting budget
+    :param patience: frames a condition must hold before switching (and after a switch)
+    :param headroom: how far above target_fps the rate must be before adding particles back
+    :param smoothing: weight of the newest frame in the exponential moving average of the rate
+    """
+    def __init__(self, contours, budgets, target_fps, level=0, patience=30, headroom=1.3, smoothing=0.1):
+        self.contours = contours
+        self.budgets = list(budgets)
+        self.target_fps = target_fps
+        self.level_i = level
+        self.patience = patience
+        self.headroom = headroom
+        self.smoothing = smoothing
+
+        self.fps = None
+        self.slow_frames = 0
+        self.fast_frames = 0
+        self.cooldown = patience
+        self.last_time = None
+
+    def targets(self):
+        return self.contours.level(self.budgets[self.level_i])
+
+    def update(self, scene, now=None):
+        """Record a frame and switch level if needed; returns True when the particles changed"""
+        now = time.perf_counter() if now is None else now
+        if self.last_time is not None and now > self.last_time:
+            fps = 1 / (now - self.last_time)
+            self.fps = fps if self.fps is None else self.fps + self.smoothing * (fps - self.fps)
+        self.last_time = now
+        if self.fps is None:
+            return False
+
+        if self.cooldown:
+            self.cooldown -= 1
+            return False
+
+        self.slow_frames = self.slow_frames + 1 if self.fps < self.target_fps else 0
+        self.fast_frames = self.fast_frames + 1 if self.fps > self.headroom * self.target_fps else 0
+
+        if self.slow_frames >= self.patience and self.level_i < len(self.budgets) - 1:
+            return self.set_level(scene, self.level_i + 1)
+        if self.fast_frames >= self.patience and self.level_i > 0:
+            return self.set_level(scene, self.level_i - 1)
+        return False
+
+    def set_level(self, scene, level_i):
+        """Remap the scene's particles onto level level_i's targets (game progress carries over)"""
+        targets, colors = self.contours.level(self.budgets[level_i])
+        src_for_dst = assign_targets(scene.particles.target, targets, method='curve')
+        scene.particles = scene.particles.remap(src_for_dst, targets, colors)
+        self.level_i = level_i
+        self.slow_frames = self.fast_frames = 0
+        self.cooldown = self.patience
+        return True
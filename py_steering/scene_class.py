@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+from .particle_class import cursor_array
+from .renderers import Cv2Renderer
+
+
+class SteerScene:
+    """Simulation state for steer_image, kept separate from any window or input handling
+
+    :param canvas: the background image particles are drawn over
+    :param particles: the ParticleSystem to simulate
+    :param game_mouse_size: radius of the cursor in game mode
+    :param renderer: how particles and overlay text are drawn; defaults to a Cv2Renderer
+    """
+    def __init__(self, canvas, particles, game_mouse_size=100, renderer=None):
+        self.canvas = canvas
+        self.particles = particles
+        self.game_mouse_size = game_mouse_size
+        self.renderer = Cv2Renderer() if renderer is None else renderer
+
+        self.game_mode = False
+        self.blink_counter = 0
+        self.blink_flag = False
+        self.particle_hit_count = 0
+        self.cursors = cursor_array(None)
+
+    def step(self, mouse_loc=None):
+        """Advance the simulation one frame
+
+        :param mouse_loc: x, y of the cursor, a list of x, y for several cursors,
+                          or None when there is no cursor on the canvas
+        """
+        self.cursors = cursor_array(mouse_loc)
+        particles = self.particles
+
+        if self.game_mode:
+            self.blink_counter += 1
+            if self.blink_counter >= 16:
+                self.blink_flag = True
+                self.blink_counter = 0
+            elif self.blink_counter >= 8:
+                self.blink_flag = False
+
+            particles.check_hit(self.cursors, self.game_mouse_size, canvas=self.canvas)
+            self.particle_hit_count = particles.game_retarget(self.canvas, self.blink_flag)
+            particles.update(self.canvas, mouse_loc=None, target=particles.game_target)
+
+            if self.particle_hit_count == len(particles):
+                self.game_mode = False
+        else:
+            particles.reset_game()
+            particles.update(self.canvas, self.cursors)
+
+    def handle_key(self, key):
+        """Apply a key press; returns False when the key asks to quit"""
+        if key == 27:
+            return False
+        elif key == ord('r'):
+            self.particles.randomize_locations(self.canvas)
+        elif key == ord('g'):
+            self.game_mode = not self.game_mode
+
+        return True
+
+    def render(self, frame):
+        """Draw the current state into frame, a preallocated buffer shaped like the canvas"""
+        np.copyto(frame, self.canvas)
+        renderer = self.renderer
+
+        if not self.game_mode:
+            renderer.draw_particles(frame, self.particles)
+            return frame
+
+        if self.blink_counter >= 8:
+            renderer.draw_text(frame, 'CATCH THEM!!', (10, frame.shape[0] - 10), 2, (30, 30, 200), thickness=3)
+
+        for cursor in self.cursors.astype('int').tolist():
+            cv2.circle(frame, tuple(cursor),
+                       radius=self.game_mouse_size,
+                       color=(150, 100, 30),
+                       thickness=-1)
+
+        renderer.draw_particles(frame, self.particles)
+
+        renderer.draw_text(frame,
+                           'Caught {} of {}'.format(self.particle_hit_count, len(self.particles)),
+                           (10, 40), 1, (255, 255, 255))
+        renderer.draw_text(frame, '(mouse over the particles)', (10, 65), 0.5, (150, 150, 150))
+
+        return frame
@@ -0,0 +1,280 @@
+"""Drive one steering simulation from many networked cursors
+
+Clients connect over TCP and send line-delimited JSON:
+
+    {"cursor": [x, y]}     the client's cursor moved (null when it leaves the canvas)
+    {"key": "g"}           a key press, as in steer_image ('g' game mode, 'r' randomize)
+    {"ack": tick}          every message up to this tick has been received (StateDecoder.ack_line)
+
+Each tick the latest cursor of every client is batched into one SteerScene.step, so
+particles flee (and in game mode are caught by) all cursors at once. Particle state goes back
+as length-prefixed (4 byte big-endian) zlib-compressed messages: a keyframe holds every
+particle's int16 x, y and BGR color, and a delta holds the change since the previous tick
+(positions subtracted, colors xor-ed), which is mostly zeros and compresses to a few bytes
+once particles settle. StateDecoder rebuilds the state on the client side.
+
+The tick loop never waits on a client: every client has its own sender task, and at most
+window messages it hasn't acknowledged yet. A client at its window misses that tick's delta and
+gets a keyframe once it acknowledges again, so slow clients see fewer frames instead of stalling
+everybody, and a client resuming after a stall reads at most window old messages (however much
+the socket buffers in between could hold) before it is back on the current tick.
+"""
+import json
+import math
+import time
+import struct
+import asyncio
+import zlib
+from collections import deque
+import numpy as np
+from .scene_class import SteerScene
+from .utils import image_to_particles
+
+KEYFRAME, DELTA = 0, 1
+# kind, game mode, tick, number of particles, number caught, canvas width, canvas height
+HEADER = struct.Struct('<BBIIIHH')
+LENGTH = struct.Struct('>I')
+MAX_LINE = 1024
+
+
+def encode_state(kind, tick, positions, colors, canvas_size, game_mode=False, caught=0, level=1):
+    """Compress one message; for a DELTA, positions and colors are the differences to send
+
+    :param canvas_size: width, height of the simulated canvas
+    """
+    header = HEADER.pack(kind, int(game_mode), tick, len(positions), caught, *canvas_size)
+    return zlib.compress(header + positions.tobytes() + colors.tobytes(), level)
+
+
+class StateDecoder:
+    """Client-side particle state rebuilt from a server's keyframes and deltas
+
+    positions is an (n, 2) int16 array of x, y and colors an (n, 3) uint8 BGR array.
+    """
+    def __init__(self):
+        self.positions = None
+        self.colors = None
+        self.canvas_size = None
+        self.tick = -1
+        self.game_mode = False
+        self.caught = 0
+
+    def apply(self, message):
+        """Apply one message (without its length prefix); returns its kind"""
+        data = zlib.decompress(message)
+        kind, game_mode, tick, n, caught, width, height = HEADER.unpack_from(data)
+        positions = np.frombuffer(data, dtype='int16', count=2 * n, offset=HEADER.size).reshape(n, 2)
+        colors = np.frombuffer(data, dtype='uint8', count=3 * n, offset=HEADER.size + 4 * n).reshape(n, 3)
+
+        if kind == KEYFRAME:
+            self.positions = positions.copy()
+            self.colors = colors.copy()
+        elif self.positions is None or len(self.positions) != n:
+            raise ValueError('delta for tick {} without a matching keyframe'.format(tick))
+        else:
+            # int16 arithmetic wraps the same way the server's subtraction did
+            self.positions += positions
+            self.colors ^= colors
+
+        self.tick, self.game_mode, self.caught = tick, bool(game_mode), caught
+        self.canvas_size = (width, height)
+        return kind
+
+    def ack_line(self):
+        """The line to send the server to acknowledge everything applied so far"""
+        return (json.dumps({'ack': self.tick}) + '\n').encode()
+
+
+async def read_message(reader):
+    """Read one length-prefixed message from a server stream"""
+    length = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+    return await reader.readexactly(length)
+
+
+class ClientSession:
+    """One connected client: its latest cursor, its outgoing message queue and the ticks of the
+    messages it hasn't acknowledged yet"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.cursor = None
+        self.queue = asyncio.Queue()
+        self.in_flight = deque()
+        self.needs_keyframe = True
+        self.dropped = 0
+
+    def acknowledge(self, tick):
+        while self.in_flight and self.in_flight[0] <= tick:
+            self.in_flight.popleft()
+
+
+class ParticleServer:
+    """Run a SteerScene on a fixed tick and stream its state to every connected client
+
+    :param scene: the SteerScene to simulate
+    :param fps: ticks per second
+    :param window: messages a client may have unacknowledged before its frames are dropped
+    :param level: zlib compression level for outgoing messages
+    """
+    def __init__(self, scene, fps=30, window=8, level=1):
+        self.scene = scene
+        self.canvas_size = scene.canvas.shape[1::-1]
+        self.fps = fps
+        self.window = window
+        self.level = level
+
+        self.clients = set()
+        self.keys = []
+        self.tick = 0
+        self.positions = None
+        self.colors = None
+        self.stats = {'ticks': 0, 'late_ticks': 0, 'messages': 0, 'dropped': 0, 'bytes': 0}
+
+    async def handle_client(self, reader, writer):
+        session = ClientSession(writer)
+        self.clients.add(session)
+        sender = asyncio.create_task(self._send_loop(session))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._handle_line(session, line)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.clients.discard(session)
+            sender.cancel()
+            await _close(writer)
+
+    def _handle_line(self, session, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+
+        if 'cursor' in message:
+            cursor = message['cursor']
+            try:
+                x, y = float(cursor[0]), float(cursor[1])
+            except (TypeError, ValueError, IndexError):
+                session.cursor = None
+            else:
+                session.cursor = (x, y) if math.isfinite(x) and math.isfinite(y) else None
+
+        ack = message.get('ack')
+        if isinstance(ack, int) and not isinstance(ack, bool):
+            session.acknowledge(ack)
+
+        key = message.get('key')
+        if isinstance(key, str) and len(key) == 1 and key != '\x1b':
+            # clients can't quit the shared simulation
+            self.keys.append(ord(key))
+
+    async def _send_loop(self, session):
+        writer = session.writer
+        try:
+            while True:
+                message = await session.queue.get()
+                writer.write(LENGTH.pack(len(message)))
+                writer.write(message)
+                await writer.drain()
+                self.stats['bytes'] += LENGTH.size + len(message)
+        except ConnectionError:
+            await _close(writer)
+
+    def _step(self, cursors, keys):
+        # runs in a worker thread so the event loop keeps serving clients meanwhile
+        scene = self.scene
+        for key in keys:
+            scene.handle_key(key)
+        scene.step(cursors)
+
+        particles = scene.particles
+        positions = np.clip(np.round(particles.location), -32768, 32767).astype('int16')
+        colors = particles.color.astype('uint8')
+        game = (scene.game_mode, scene.particle_hit_count)
+
+        delta = None
+        if self.positions is not None and len(self.positions) == len(positions):
+            delta = encode_state(DELTA, self.tick, positions - self.positions, colors ^ self.colors,
+                                 self.canvas_size, *game, level=self.level)
+        self.positions, self.colors = positions, colors
+        return delta, game
+
+    def _broadcast(self, delta, game):
+        keyframe = None
+        for session in self.clients:
+            if len(session.in_flight) >= self.window:
+                session.needs_keyframe = True
+                session.dropped += 1
+                self.stats['dropped'] += 1
+                continue
+
+            if session.needs_keyframe or delta is None:
+                if keyframe is None:
+                    keyframe = encode_state(KEYFRAME, self.tick, self.positions, self.colors, self.canvas_size,
+                                            *game, level=self.level)
+                session.queue.put_nowait(keyframe)
+                session.needs_keyframe = False
+            else:
+                session.queue.put_nowait(delta)
+            session.in_flight.append(self.tick)
+            self.stats['messages'] += 1
+
+    async def tick_loop(self, n_ticks=None):
+        """Step and broadcast every 1 / fps seconds (forever, or for n_ticks ticks)"""
+        dt = 1 / self.fps
+        next_tick = time.perf_counter()
+        while n_ticks is None or self.stats['ticks'] < n_ticks:
+            cursors = [session.cursor for session in self.clients if session.cursor is not None]
+            keys, self.keys = self.keys, []
+
+            delta, game = await asyncio.to_thread(self._step, cursors, keys)
+            self._broadcast(delta, game)
+            self.tick += 1
+            self.stats['ticks'] += 1
+
+            next_tick += dt
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                # behind schedule: carry on from now rather than bursting to catch up
+                self.stats['late_ticks'] += 1
+                next_tick = time.perf_counter()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def serve(self, host='127.0.0.1', port=8765, n_ticks=None):
+        """Accept clients on host:port and run the tick loop until n_ticks (or forever)"""
+        server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        async with server:
+            await self.tick_loop(n_ticks)
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+def serve_image(image, host='127.0.0.1', port=8765, fps=30, thresh_args=(), seed=None, window=8,
+                n_ticks=None, budget=None):
+    """Serve a steering simulation of image to networked cursors (see ParticleServer)
+
+    :param budget: particles spread along the contours by arc length (every 20th contour point if None)
+
+    :return: the server's stats
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    canvas = np.zeros(image.shape, dtype='uint8') + 50
+    particles = image_to_particles(image, canvas, every_n=20, radius=4, thresh_args=thresh_args, budget=budget)
+    server = ParticleServer(SteerScene(canvas, particles), fps=fps, window=window)
+    try:
+        asyncio.run(server.serve(host, port, n_ticks))
+    except KeyboardInterrupt:
+        pass
+    return server.stats
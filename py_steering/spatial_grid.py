@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class SpatialHashGrid:
+    """Uniform grid index over 2d points for radius queries
+
+    Points are bucketed into square cells and stored in cell order (a CSR style layout:
+    ``order`` holds point indices sorted by cell and ``cell_start[c]:cell_start[c + 1]``
+    is the slice of ``order`` in cell ``c``). Points outside the grid bounds are clamped
+    into the border cells so every point is always indexed.
+
+    :param bounds: (width, height) of the area the grid covers
+    :param cell_size: side length of a grid cell; roughly the typical query radius works well
+    """
+    def __init__(self, bounds, cell_size=50):
+        self.cell_size = float(cell_size)
+        self.n_cols = max(1, int(np.ceil(bounds[0] / self.cell_size)))
+        self.n_rows = max(1, int(np.ceil(bounds[1] / self.cell_size)))
+
+        self.points = np.zeros((0, 2), dtype='float64')
+        self.cells = np.zeros(0, dtype='int64')
+        self.order = np.zeros(0, dtype='int64')
+        self.cell_start = np.zeros(self.n_cols * self.n_rows + 1, dtype='int64')
+
+    def _cell_coords(self, points):
+        cols = np.clip(points[:, 0] // self.cell_size, 0, self.n_cols - 1).astype('int64')
+        rows = np.clip(points[:, 1] // self.cell_size, 0, self.n_rows - 1).astype('int64')
+        return cols, rows
+
+    def update(self, points):
+        """Re-index points (an (N, 2) array), reusing the previous ordering where possible
+
+        Only points that changed cells move in ``order``: the new cell ids are laid out in
+        the previous order, which is already nearly sorted, and a stable sort (timsort)
+        of nearly sorted data runs in close to linear time.
+        When no point changed cells the index is left as is.
+        """
+        self.points = points
+        cols, rows = self._cell_coords(points)
+        cells = rows * self.n_cols + cols
+
+        if len(cells) == len(self.cells):
+            if np.array_equal(cells, self.cells):
+                return self
+            order = self.order[np.argsort(cells[self.order], kind='stable')]
+        else:
+            order = np.argsort(cells, kind='stable')
+
+        self.cells = cells
+        self.order = order
+        counts = np.bincount(cells, minlength=self.n_cols * self.n_rows)
+        self.cell_start[1:] = np.cumsum(counts)
+        return self
+
+    def _candidates(self, center, radius):
+        col_0, row_0 = self._cell_coords(np.array([[center[0] - radius, center[1] - radius]]))
+        col_1, row_1 = self._cell_coords(np.array([[center[0] + radius, center[1] + radius]]))
+
+        slices = []
+        for row in range(row_0[0], row_1[0] + 1):
+            # cells in a row are contiguous in the CSR layout, so each row is a single slice
+            start = self.cell_start[row * self.n_cols + col_0[0]]
+            stop = self.cell_start[row * self.n_cols + col_1[0] + 1]
+            if stop > start:
+                slices.append(self.order[start:stop])
+
+        return np.concatenate(slices) if slices else self.order[:0]
+
+    def query_radius(self, center, radius):
+        """Indices of points within radius of center (x, y)"""
+        if not np.all(np.isfinite(center)):
+            return self.order[:0]
+
+        candidates = self._candidates(center, radius)
+        xy_diff = self.points[candidates] - center
+        in_range = np.einsum('ij,ij->i', xy_diff, xy_diff) <= radius ** 2
+        return candidates[in_range]
+
+    def query_many(self, centers, radius):
+        """Indices of points within radius of any of centers; a list of (x, y)"""
+        found = [self.query_radius(center, radius) for center in centers]
+        if not found:
+            return self.order[:0]
+
+        return np.unique(np.concatenate(found))
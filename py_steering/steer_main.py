@@ -1,23 +1,139 @@
+"""Particle steering demo (`misc-sims steer` or `python -m py_steering.steer_main`)
+
+Only argparse is imported at module level; OpenCV, NumPy and the simulation modules are
+imported by main() once the arguments have been parsed.
+"""
+import os
 import argparse
-import cv2
-import imutils
-from utils import steer_image
-
-ap = argparse.ArgumentParser()
-ap.add_argument('-i', '--input', default='input/pyimage_combo.png',
-                help='path to input image')
-ap.add_argument('-w', '--resizeWidth', type=int, default=900,
-                help='pixel width to resize to before processing')
-ap.add_argument('-t', '--thresholdParams', nargs=3, type=int,
-                help='custom params for thresholding before contour detection')
-args = vars(ap.parse_args())
-
-image = cv2.imread(args['input'])
-image = imutils.resize(image, width=args['resizeWidth'])
-if args['thresholdParams']:
-    steer_image(image, *tuple(args['thresholdParams']))
-else:
-    steer_image(image)
-
-# use for sensor tower logo
-# steer_image(image, 75, 255, 0)
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input', 'pyimage_combo.png')
+# options of the windowed/headless loops that the networked server has no use for
+SERVE_UNSUPPORTED = ('--headless', '--cursor', '--output', '--keys', '--morphEvery', '--targetFps', '--profile',
+                     '--profileOut')
+
+
+def parse_keys(keys):
+    # '0:g,120:r' -> {0: 'g', 120: 'r'}
+    frame_keys = (pair.split(':') for pair in keys.split(',') if pair)
+    return {int(frame_i): key for frame_i, key in frame_keys}
+
+
+def add_arguments(ap):
+    ap.add_argument('-i', '--input', nargs='+', default=[DEFAULT_INPUT],
+                    help='path to input image; several images or directories make a playlist to morph through')
+    ap.add_argument('-w', '--resizeWidth', type=int, default=900,
+                    help='pixel width to resize to before processing')
+    ap.add_argument('-t', '--thresholdParams', nargs=3, type=int,
+                    help='custom params for thresholding before contour detection')
+    ap.add_argument('-m', '--morphEvery', type=int,
+                    help='(playlist) morph to the next image every this many frames; otherwise press N')
+    ap.add_argument('-a', '--assignment', choices=('curve', 'hungarian'), default='hungarian',
+                    help='(playlist) how particles are matched to the next image\'s targets '
+                         '(hungarian needs scipy, else curve)')
+    ap.add_argument('-r', '--renderer', choices=('cv2', 'sprite'), default='cv2',
+                    help='draw particles one cv2.circle at a time or with the batched sprite renderer '
+                         '(faster from roughly 15k particles)')
+    ap.add_argument('--headless', action='store_true',
+                    help='run a fixed number of frames without any GUI')
+    ap.add_argument('-c', '--cursor',
+                    help='(headless) csv of scripted cursor positions; rows of "x,y" per frame or "t,x,y" '
+                         '(add more x,y pairs for several cursors)')
+    ap.add_argument('-n', '--nFrames', type=int, default=300,
+                    help='(headless) number of frames to simulate')
+    ap.add_argument('--fps', type=int, default=30,
+                    help='(headless) simulation steps per second of output')
+    ap.add_argument('-o', '--output',
+                    help='(headless) path to stream frames to (.gif, .mp4/.avi, or a PNG pattern/directory)')
+    ap.add_argument('-k', '--keys', type=parse_keys, default={},
+                    help='(headless) scripted key presses as frame:key pairs, e.g. "0:g,150:r"')
+    ap.add_argument('-s', '--seed', type=int,
+                    help='(headless) random seed for repeatable runs')
+    ap.add_argument('-b', '--budget', type=int,
+                    help='spread this many particles along the contours by arc length (instead of every 20th '
+                         'contour point)')
+    ap.add_argument('--targetFps', type=float,
+                    help='drop to fewer particles (halving from --budget) while the frame rate is below this, '
+                         'and add them back when it recovers')
+    ap.add_argument('--serve', action='store_true',
+                    help='run without a window, driven by cursors from TCP clients (see py_steering.server)')
+    ap.add_argument('--host', default='127.0.0.1', help='(serve) address to listen on')
+    ap.add_argument('--port', type=int, default=8765, help='(serve) port to listen on')
+    ap.add_argument('--profile', action='store_true',
+                    help='time the loop\'s phases and draw FPS and ms per phase on the frames')
+    ap.add_argument('--profileOut',
+                    help='path to write per-phase timing stats and histograms (JSON) to on exit')
+    return ap
+
+
+def main(args):
+    import cv2
+    import imutils
+    from misc_sims.instrument import NULL_INSTRUMENT, Instrument
+    from .headless import run_headless
+    from .morph import Playlist
+    from .server import serve_image
+    from .utils import steer_image
+
+    instrument = NULL_INSTRUMENT
+    if args['profile'] or args['profileOut']:
+        instrument = Instrument(overlay=args['profile'])
+
+    thresh_args = tuple(args['thresholdParams']) if args['thresholdParams'] else ()
+    is_playlist = len(args['input']) > 1 or os.path.isdir(args['input'][0])
+    if args['serve']:
+        unsupported = [flag for flag in SERVE_UNSUPPORTED if args[flag.lstrip('-')]]
+        if args['renderer'] != 'cv2':
+            unsupported.append('--renderer')
+        if is_playlist:
+            unsupported.append('a playlist (several --input images or a directory)')
+        if unsupported:
+            raise SystemExit('{} can\'t be used with --serve'.format(', '.join(unsupported)))
+
+    playlist = None
+    if is_playlist:
+        if args['budget'] or args['targetFps']:
+            raise SystemExit('--budget and --targetFps only apply to a single input image')
+        playlist = Playlist(args['input'], args['resizeWidth'], thresh_args, method=args['assignment'])
+        image = playlist.first_image
+    else:
+        image = cv2.imread(args['input'][0])
+        image = imutils.resize(image, width=args['resizeWidth'])
+
+    try:
+        if args['serve']:
+            print('serving {} on {}:{} (Ctrl-C to stop)'.format(args['input'][0], args['host'], args['port']))
+            stats = serve_image(image, args['host'], args['port'], fps=args['fps'], thresh_args=thresh_args,
+                                seed=args['seed'], budget=args['budget'])
+            print('{ticks} ticks, {messages} messages ({bytes} bytes) sent, {dropped} dropped'.format(**stats))
+        elif args['headless']:
+            stats = run_headless(image,
+                                 cursor=args['cursor'],
+                                 n_frames=args['nFrames'],
+                                 fps=args['fps'],
+                                 output=args['output'],
+                                 thresh_args=thresh_args,
+                                 keys=args['keys'],
+                                 seed=args['seed'],
+                                 renderer=args['renderer'],
+                                 playlist=playlist,
+                                 morph_every=args['morphEvery'],
+                                 instrument=instrument,
+                                 budget=args['budget'],
+                                 target_fps=args['targetFps'])
+            print('{frames} frames of {particles} particles in {seconds:.2f}s ({fps:.1f} fps)'.format(**stats))
+        else:
+            steer_image(image, *thresh_args, renderer=args['renderer'], playlist=playlist,
+                        morph_every=args['morphEvery'], instrument=instrument, budget=args['budget'],
+                        target_fps=args['targetFps'])
+    finally:
+        if playlist is not None:
+            playlist.close()
+        if args['profileOut']:
+            instrument.export(args['profileOut'])
+
+    # use for sensor tower logo
+    # steer_image(image, 75, 255, 0)
+
+
+if __name__ == '__main__':
+    main(vars(add_arguments(argparse.ArgumentParser()).parse_args()))
@@ -1,66 +1,55 @@
 import cv2
 import numpy as np
-from particle_class import Particle
-
-
-def image_to_particles(image, canvas, every_n=20, radius=4, thresh_args=()):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    if not thresh_args:
-        thresh_args = (5, 255, 0)
-    _, threshed = cv2.threshold(gray, *thresh_args)
-
-    _, contours, _ = cv2.findContours(threshed, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
-    canvas_area = canvas.shape[0] * canvas.shape[1]
-    contours = [c for c in contours if cv2.contourArea(c) < .95 * canvas_area]
-    contour_colors = [get_contour_color(c, image) for c in contours]
-    contour_points = [down_sample_points(c, every_n) for c in contours]
-
-    particles = create_particles(contour_points, contour_colors, image, rand_location=True, radius=radius)
-
-    return particles
-
-
-def down_sample_points(contour, every_n=20):
-    return contour[::every_n]
-
-
-def get_contour_color(contour, image):
-    moments = cv2.moments(contour)
-    if not sum(list(moments.values())):
-        return 50, 50, 50
-    cx = int(moments["m10"] / moments["m00"])
-    cy = int(moments["m01"] / moments["m00"])
-
-    color = image[cy, cx]
-    color = tuple(int(x) for x in color)
-
-    if color == (0, 0, 0):
-        mask = np.zeros(image.shape[:2], dtype='uint8')
-        cv2.drawContours(mask, [contour], -1, 255, -1)
-
-        masked = cv2.bitwise_and(image, image, mask=mask)
-        non_zero = np.where(masked != 0)
-        if non_zero:
-            color_pool = masked[non_zero[0], non_zero[1], :]
-            color = np.mean(color_pool, axis=0)
-            color = tuple(int(x) for x in color)
-
-    return color
+from misc_sims.instrument import NULL_INSTRUMENT
+from .morph import MorphController
+from .particle_class import ParticleSystem, random_locations
+from .preprocess import DEFAULT_CACHE_DIR, contour_targets
+from .renderers import get_renderer
+from .resample import AdaptiveLOD, ContourSet
+from .scene_class import SteerScene
+
+
+def image_to_particles(image, canvas, every_n=20, radius=4, thresh_args=(), cache_dir=DEFAULT_CACHE_DIR,
+                       budget=None):
+    """:param budget: if set, spread this many particles along the contours by arc length
+                   (see resample.ContourSet) instead of keeping every_n-th contour point"""
+    if budget is None:
+        targets, colors = contour_targets(image, every_n, thresh_args, cache_dir=cache_dir)
+    else:
+        targets, colors = ContourSet.from_image(image, thresh_args, cache_dir).level(budget)
+    locations = random_locations(len(targets), canvas)
+
+    return ParticleSystem(locations, targets, radius, colors)
+
+
+def steer_particles(image, canvas, thresh_args=(), budget=None, target_fps=None, radius=4):
+    """Particles for steer_image/run_headless, plus an AdaptiveLOD when target_fps is set (else None)
+
+    :param budget: particle budget (the highest level of detail with target_fps); every 20th
+                   contour point when None
+    :param target_fps: frame rate the AdaptiveLOD drops particles to hold
+    """
+    if not target_fps:
+        return image_to_particles(image, canvas, every_n=20, radius=radius, thresh_args=thresh_args,
+                                  budget=budget), None
+
+    contours = ContourSet.from_image(image, thresh_args)
+    if budget is None:
+        budget = contours.full_budget(every_n=20)
+    lod = AdaptiveLOD(contours, contours.lod_budgets(budget), target_fps)
+    targets, colors = lod.targets()
+    return ParticleSystem(random_locations(len(targets), canvas), targets, radius, colors), lod
 
 
 def create_particles(contour_points, contour_colors, canvas, rand_location=True, radius=4):
-    particles = []
-    for i, points in enumerate(contour_points):
-        color = contour_colors[i]
-        for point in points:
-            location = target = tuple(point.flatten())
-            if rand_location:
-                location = tuple(np.random.randint(1, canvas.shape[1], 1)) + \
-                           tuple(np.random.randint(1, canvas.shape[0], 1))
-            particle = Particle(location, target, radius, color)
-            particles.append(particle)
+    targets = [points.reshape(-1, 2) for points in contour_points]
+    colors = [np.tile(color, (len(points), 1)) for points, color in zip(targets, contour_colors)]
+    targets = np.concatenate(targets) if targets else np.zeros((0, 2))
+    colors = np.concatenate(colors) if colors else np.zeros((0, 3))
+
+    locations = random_locations(len(targets), canvas) if rand_location else targets
 
-    return particles
+    return ParticleSystem(locations, targets, radius, colors)
 
 
 mouse_x = float('inf')
@@ -75,88 +64,46 @@ def get_mouse_xy(event, x, y, flags, param):
         mouse_y = y
 
 
-def steer_image(image, *args):
+def steer_image(image, *args, renderer='cv2', playlist=None, morph_every=None, instrument=NULL_INSTRUMENT,
+                budget=None, target_fps=None):
+    """Run the interactive steering demo until ESC is pressed
+
+    :param instrument: a misc_sims.instrument.Instrument to time the loop's phases into (its
+                       overlay is drawn on every frame); the no-op NULL_INSTRUMENT by default
+    :param budget, target_fps: particle budget and adaptive level of detail; see steer_particles
+    """
     canvas = np.zeros(image.shape, dtype='uint8') + 50
 
-    particles = image_to_particles(image, canvas, every_n=20, radius=4, thresh_args=args)
+    particles, lod = steer_particles(image, canvas, args, budget, target_fps)
+
+    scene = SteerScene(canvas, particles, renderer=get_renderer(renderer))
+    frame = np.empty_like(canvas)
+    morpher = MorphController(playlist, morph_every) if playlist is not None else None
 
     window_name = 'Press R to randomize, G to toggle game mode, ESC to quit'
+    if morpher is not None:
+        window_name = 'Press N for the next image, R to randomize, G to toggle game mode, ESC to quit'
     cv2.namedWindow(window_name)
     cv2.setMouseCallback(window_name, get_mouse_xy)
 
-    game_mode = False
-    game_mouse_size = 100
-    blink_counter = 0
-    blink_flag = False
     while True:
-        canvas_i = canvas.copy()
-        if game_mode:
-            blink_counter += 1
-            if blink_counter >= 16:
-                blink_flag = True
-                blink_counter = 0
-            elif blink_counter >= 8:
-                blink_flag = False
-                cv2.putText(canvas_i, 'CATCH THEM!!', (10, canvas.shape[0] - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 2, (30, 30, 200), thickness=3)
-
-            game_mouse_color = (150, 100, 30)
-            if mouse_x != float('inf') and mouse_y != float('inf'):
-                cv2.circle(canvas_i, (mouse_x, mouse_y),
-                           radius=game_mouse_size,
-                           color=game_mouse_color,
-                           thickness=-1)
-
-            particle_hit_count = 0
-            for particle in particles:
-                particle.check_hit((mouse_x, mouse_y), game_mouse_size)
-                if not particle.is_hit and np.linalg.norm(particle.location - particle.game_target) <= 30:
-                    if blink_flag:
-                        particle.color = (30, 30, 200)
-                    else:
-                        particle.color = (100, 100, 150)
-                    game_target = tuple(np.random.randint(1, canvas.shape[1], 1)) + \
-                                  tuple(np.random.randint(1, canvas.shape[0], 1))
-                    particle.game_target = np.array(game_target)
-                elif particle.is_hit:
-                    particle_hit_count += 1
-
-                particle.update(canvas_i,
-                                mouse_loc=None,
-                                target=particle.game_target)
-                particle.show(canvas_i)
-
-            if particle_hit_count == len(particles):
-                game_mode = False
-            else:
-                cv2.putText(canvas_i,
-                            'Caught {} of {}'.format(particle_hit_count, len(particles)),
-                            (10, 40),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), thickness=1)
-
-                cv2.putText(canvas_i,
-                            '(mouse over the particles)',
-                            (10, 65),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (150, 150, 150), thickness=1)
-
-        else:
-            for particle in particles:
-                particle.color = particle.og_color
-                particle.is_hit = False
-                particle.update(canvas_i, (mouse_x, mouse_y))
-                particle.show(canvas_i)
-
-        cv2.imshow(window_name, canvas_i)
-        key = cv2.waitKey(10)
-
-        if key == 27:
+        with instrument.span('step'):
+            scene.step((mouse_x, mouse_y))
+        with instrument.span('render'):
+            scene.render(frame)
+        instrument.count('particles', len(scene.particles))
+        instrument.draw_overlay(frame)
+
+        with instrument.span('display'):
+            cv2.imshow(window_name, frame)
+            key = cv2.waitKey(10)
+        instrument.tick()
+
+        if not scene.handle_key(key):
             break
-        elif key == ord('r'):
-            for particle in particles:
-                particle.location = tuple(np.random.randint(1, canvas.shape[1], 1)) + \
-                                    tuple(np.random.randint(1, canvas.shape[0], 1))
-        elif key == ord('g'):
-            game_mode = not game_mode
-            game_target = tuple(np.random.randint(1, canvas.shape[1], 1)) + \
-                          tuple(np.random.randint(1, canvas.shape[0], 1))
-            particle.game_target = np.array(game_target)
+        if morpher is not None:
+            with instrument.span('morph'):
+                morpher.update(scene, key)
+        if lod is not None:
+            with instrument.span('lod'):
+                lod.update(scene)
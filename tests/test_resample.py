@@ -0,0 +1,52 @@
+import cv2
+import imutils
+import numpy as np
+from py_steering.particle_class import ParticleSystem, random_locations
+from py_steering.resample import AdaptiveLOD, ContourSet
+from py_steering.scene_class import SteerScene
+from py_steering.steer_main import DEFAULT_INPUT
+
+
+def game_scene(budget=2000, n_caught=1896):
+    np.random.seed(0)
+    image = imutils.resize(cv2.imread(DEFAULT_INPUT), width=900)
+    canvas = np.zeros(image.shape, dtype='uint8') + 50
+    contours = ContourSet.from_image(image, cache_dir=None)
+    lod = AdaptiveLOD(contours, contours.lod_budgets(budget), target_fps=30)
+    targets, colors = lod.targets()
+    scene = SteerScene(canvas, ParticleSystem(random_locations(len(targets), canvas), targets, 4, colors))
+
+    scene.handle_key(ord('g'))
+    scene.particles.is_hit[:n_caught] = True
+    scene.step()
+    return scene, lod
+
+
+def test_lod_switch_keeps_game_progress():
+    scene, lod = game_scene()
+    n = len(scene.particles)
+    assert scene.particle_hit_count == 1896
+
+    lod.set_level(scene, 1)
+    scene.step()
+    assert scene.game_mode
+    assert len(scene.particles) < n
+    # about the same share of the (fewer) particles is still caught
+    assert abs(scene.particle_hit_count / len(scene.particles) - 1896 / n) < 0.05
+
+    lod.set_level(scene, 0)
+    scene.step()
+    assert len(scene.particles) == n
+    assert abs(scene.particle_hit_count / n - 1896 / n) < 0.05
+
+
+def test_lod_switch_keeps_uncaught_game_targets():
+    scene, lod = game_scene()
+    particles = scene.particles
+    uncaught = np.flatnonzero(~particles.is_hit)
+    particles.game_target[uncaught] = (5, 5)
+
+    lod.set_level(scene, 1)
+    remapped = scene.particles
+    assert (remapped.game_target[~remapped.is_hit] == (5, 5)).all()
+    assert (remapped.game_target[remapped.is_hit] == remapped.target[remapped.is_hit]).all()